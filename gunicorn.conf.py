@@ -0,0 +1,18 @@
+# Read by gunicorn from the working directory (see Procfile)
+
+
+def post_worker_init(worker):
+    # The application is loaded by now; compile the templates before the worker takes requests
+    from mable.warmup import warm_up
+
+    timings, errors = warm_up()
+    worker.log.info('Compiled %d templates in %.0f ms', len(timings), sum(timings.values()) * 1000)
+    for name, error in errors.items():
+        worker.log.warning('Template %s failed to compile: %s', name, error)
+
+
+def worker_exit(server, worker):
+    # Hand pooled database connections back to the server rather than leaving them to time out
+    from mable.postgresql_pool.base import close_pools
+
+    close_pools()
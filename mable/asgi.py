@@ -9,8 +9,44 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mable.settings')
 
-application = get_asgi_application()
+
+class StreamingASGIHandler(ASGIHandler):
+    # Django 4.1 iterates streaming responses on the event loop, where generators that query
+    # the database (the ticket exports) are not allowed to run. Pull each part in the request's
+    # sync thread instead, which also keeps file reads for media downloads off the loop.
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        parts = iter(response)
+        response.streaming_content = []
+
+        async def send_parts(message):
+            # Django sends the headers, then an empty closing message; the parts go in between
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                while (part := await sync_to_async(next, thread_sensitive=True)(parts, None)) is not None:
+                    for chunk, last in self.chunk_bytes(part):
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send(message)
+
+        await super().send_response(response, send_parts)
+
+
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+# Imported after setup so the notifications app is loaded
+from notifications.stream import STREAM_PATH, notification_stream
+
+
+async def application(scope, receive, send):
+    # Live notifications are streamed without going through Django's request cycle
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        return await notification_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,12 @@
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+
+
+def health(request):
+    # For load balancers and uptime checks: no session or login, one trivial query to show the database answers
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return JsonResponse({'status': 'unavailable'}, status=503)
+    return JsonResponse({'status': 'ok'})
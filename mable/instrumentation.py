@@ -0,0 +1,277 @@
+"""
+Per-view request metrics for a sample of requests.
+
+InstrumentationMiddleware times the view, counts and times every SQL query via
+connection.execute_wrapper, times template rendering and records the response
+size, aggregated by URL name. Queries repeated many times within one request
+are reported as likely N+1 patterns. Metrics live in process memory, so each
+worker reports its own; scrape every worker or read them as a sample.
+
+Staff can read them as JSON at /instrumentation/ and as Prometheus text at
+/instrumentation/metrics.
+"""
+
+import bisect
+import contextlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.template.backends.django import Template
+
+DEFAULTS = {
+    # Fraction of requests measured; 0 turns the middleware into a single comparison
+    'SAMPLE_RATE': 0.0,
+    # Upper bounds of the latency histogram buckets, in seconds
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    # The same SQL run this many times in one request is flagged as a likely N+1
+    'DUPLICATE_THRESHOLD': 5,
+    # Repeated statements kept per view in the report
+    'DUPLICATE_LIMIT': 10,
+}
+
+# The sample being recorded by the request running in this thread or task, if any
+current_sample = ContextVar('instrumentation_sample', default=None)
+
+
+def instrumentation_setting(name):
+    return getattr(settings, 'INSTRUMENTATION', {}).get(name, DEFAULTS[name])
+
+
+class Sample:
+    def __init__(self):
+        self.queries = {}
+        self.query_count = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper around every query of the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.query_count += 1
+            # Parameters are kept apart from the SQL, so the same statement in a loop compares equal
+            self.queries[sql] = self.queries.get(sql, 0) + 1
+
+    def duplicates(self, threshold):
+        return {sql: count for sql, count in self.queries.items() if count >= threshold}
+
+
+class ViewStats:
+    def __init__(self, buckets):
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.max_duration = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.response_bytes = 0
+        self.flagged = 0
+        self.duplicates = {}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.buckets = tuple(instrumentation_setting('BUCKETS'))
+            self.views = {}
+
+    def record(self, view, duration, sample, response_bytes):
+        threshold = instrumentation_setting('DUPLICATE_THRESHOLD')
+        duplicates = sample.duplicates(threshold)
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats(self.buckets)
+            stats.bucket_counts[bisect.bisect_left(self.buckets, duration)] += 1
+            stats.count += 1
+            stats.duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+            stats.queries += sample.query_count
+            stats.max_queries = max(stats.max_queries, sample.query_count)
+            stats.query_time += sample.query_time
+            stats.template_time += sample.template_time
+            stats.response_bytes += response_bytes
+            if duplicates:
+                stats.flagged += 1
+                for sql, count in duplicates.items():
+                    stats.duplicates[sql] = max(stats.duplicates.get(sql, 0), count)
+                if len(stats.duplicates) > instrumentation_setting('DUPLICATE_LIMIT'):
+                    worst = sorted(stats.duplicates.items(), key=lambda item: -item[1])
+                    stats.duplicates = dict(worst[:instrumentation_setting('DUPLICATE_LIMIT')])
+
+    def percentile(self, stats, fraction):
+        # Upper bound of the bucket holding the given fraction of requests
+        target = stats.count * fraction
+        seen = 0
+        for bound, count in zip(self.buckets, stats.bucket_counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return stats.max_duration
+
+    def report(self):
+        with self.lock:
+            views = []
+            for view, stats in self.views.items():
+                views.append({
+                    'view': view,
+                    'count': stats.count,
+                    'mean_ms': round(stats.duration / stats.count * 1000, 2),
+                    'p50_ms': round(self.percentile(stats, 0.5) * 1000, 2),
+                    'p95_ms': round(self.percentile(stats, 0.95) * 1000, 2),
+                    'max_ms': round(stats.max_duration * 1000, 2),
+                    'mean_queries': round(stats.queries / stats.count, 2),
+                    'max_queries': stats.max_queries,
+                    'mean_query_ms': round(stats.query_time / stats.count * 1000, 2),
+                    'mean_template_ms': round(stats.template_time / stats.count * 1000, 2),
+                    'mean_response_bytes': round(stats.response_bytes / stats.count),
+                    'n_plus_one_requests': stats.flagged,
+                    'repeated_queries': [
+                        {'sql': sql, 'max_per_request': count}
+                        for sql, count in sorted(stats.duplicates.items(), key=lambda item: -item[1])
+                    ],
+                })
+        # Where the time goes overall, not just the slowest single request
+        views.sort(key=lambda row: -row['mean_ms'] * row['count'])
+        return views
+
+    def prometheus(self):
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            views = sorted(self.views.items())
+
+            metric('mable_request_duration_seconds', 'histogram', 'Time spent in the view and middleware below it.')
+            for view, stats in views:
+                label = escape_label(view)
+                cumulative = 0
+                for bound, count in zip(self.buckets, stats.bucket_counts):
+                    cumulative += count
+                    lines.append(f'mable_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'mable_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {stats.count}')
+                lines.append(f'mable_request_duration_seconds_sum{{view="{label}"}} {stats.duration}')
+                lines.append(f'mable_request_duration_seconds_count{{view="{label}"}} {stats.count}')
+
+            totals = [
+                ('mable_db_queries_total', 'SQL queries run by sampled requests.', 'queries'),
+                ('mable_db_query_seconds_total', 'Time spent in SQL queries by sampled requests.', 'query_time'),
+                ('mable_template_render_seconds_total', 'Time spent rendering templates.', 'template_time'),
+                ('mable_response_bytes_total', 'Bytes in sampled response bodies.', 'response_bytes'),
+                ('mable_n_plus_one_requests_total', 'Sampled requests that repeated a query.', 'flagged'),
+            ]
+            for name, help_text, attribute in totals:
+                metric(name, 'counter', help_text)
+                for view, stats in views:
+                    lines.append(f'{name}{{view="{escape_label(view)}"}} {getattr(stats, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+_original_render = Template.render
+_patch_lock = threading.Lock()
+
+
+def timed_render(self, context=None, request=None):
+    sample = current_sample.get()
+    if sample is None:
+        return _original_render(self, context, request)
+    # Only the outermost render is timed; templates rendered inside it are already counted
+    sample.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        sample.template_depth -= 1
+        if not sample.template_depth:
+            sample.template_time += time.perf_counter() - start
+
+
+def install_template_timer():
+    with _patch_lock:
+        if Template.render is not timed_render:
+            Template.render = timed_render
+
+
+def response_size(response):
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    if response.streaming:
+        return 0
+    return len(response.content)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timer()
+
+    def __call__(self, request):
+        sample_rate = instrumentation_setting('SAMPLE_RATE')
+        if not sample_rate or random.random() >= sample_rate:
+            return self.get_response(request)
+
+        sample = Sample()
+        token = current_sample.set(sample)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = (match.view_name if match else None) or 'unresolved'
+        registry.record(view, duration, sample, response_size(response))
+        return response
+
+
+def staff_only(view_func):
+    def wrapper_func(request, *args, **kwargs):
+        if request.user.is_staff:
+            return view_func(request, *args, **kwargs)
+        else:
+            return HttpResponseForbidden()
+    return wrapper_func
+
+
+@staff_only
+def instrumentation_report(request):
+    if request.method == 'POST' and request.POST.get('reset'):
+        registry.reset()
+    return JsonResponse({
+        'sample_rate': instrumentation_setting('SAMPLE_RATE'),
+        'views': registry.report(),
+    })
+
+
+@staff_only
+def instrumentation_metrics(request):
+    return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,174 @@
+"""
+Serves MEDIA_ROOT in production, replacing django.views.static.serve.
+
+Without a front-end server, files and ranges are streamed in blocks. The
+Procfile runs the ASGI application under uvicorn, which has no file wrapper or
+sendfile: every block passes through the worker (in a thread, see
+mable/asgi.py StreamingASGIHandler). Production should therefore set
+MEDIA_ACCEL_REDIRECT (nginx) or MEDIA_X_SENDFILE (Apache, lighttpd), so the
+front-end server sends the bytes after Django has checked access.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from tickets.models import Attachment, Ticket
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Types a browser may show inline; anything else uploaded to a ticket is downloaded
+INLINE_TYPES = ('image/', 'text/plain', 'application/pdf')
+
+BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    # Reads at most length bytes from an already positioned file
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_path(path):
+    # Resolve the URL path under MEDIA_ROOT, refusing anything that escapes it
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    # Unfinished chunked uploads are never served
+    upload_dir = getattr(settings, 'ATTACHMENT_UPLOAD_DIR', None)
+    if upload_dir and os.path.commonpath([full_path, os.path.abspath(upload_dir)]) == os.path.abspath(upload_dir):
+        raise Http404
+    return full_path
+
+
+def attachment_for(request, path):
+    # Attachment blobs are shared between tickets; serve one if any ticket holding it is visible
+    attachment = (Attachment.objects
+                  .filter(file=path, ticket__in=Ticket.objects.visible_to(request.user))
+                  .only('id', 'filename').first())
+    if attachment is None:
+        raise Http404
+    return attachment
+
+
+def etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    return etag in [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+
+def parse_range(header, size):
+    # A single 'bytes=' range as (start, end) inclusive, None to send the whole file, or False if unsatisfiable
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last n bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_media(request, path):
+    full_path = media_path(path)
+    path = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+    attachment = None
+    if path.startswith('attachments/'):
+        attachment = attachment_for(request, path)
+
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    filename = attachment.filename if attachment and attachment.filename else os.path.basename(full_path)
+    as_attachment = attachment is not None and not content_type.startswith(INLINE_TYPES)
+    if attachment or path.startswith('avatars/'):
+        # Content addressed, so the bytes behind this URL never change
+        cache_control = 'private, max-age=31536000, immutable'
+    else:
+        # Originals such as default.jpg can be replaced under the same name, revalidate with the ETag
+        cache_control = 'private, no-cache'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = cache_control
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return finish(HttpResponseNotModified())
+    else:
+        modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if modified_since is not None and int(stat.st_mtime) <= modified_since:
+            return finish(HttpResponseNotModified())
+
+    # Hand the transfer to the front-end server, which handles ranges itself
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT', None)
+    if accel_prefix or getattr(settings, 'MEDIA_X_SENDFILE', False):
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+        return finish(response)
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_range(range_header, stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return finish(response)
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(FileRange(file, end - start + 1), as_attachment=as_attachment,
+                                filename=filename, content_type=content_type, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response.block_size = BLOCK_SIZE
+    return finish(response)
@@ -0,0 +1,119 @@
+"""
+PostgreSQL backend that borrows connections from a per-process pool.
+
+Django 4.1 opens a connection per thread and, with CONN_MAX_AGE, keeps it with that
+thread. Under the ASGI worker every request may run in a different thread, so this
+backend hands connections back to a shared psycopg2 pool when Django closes them
+instead. Configured through DATABASES['default']['POOL'], see mable/database.py.
+
+Idle connections may have been dropped by a server restart, so each one is pinged
+when it is borrowed and replaced if it does not answer. A process's pools are closed
+when it exits, and the test database's pool before the test runner drops it.
+"""
+
+import atexit
+import os
+import threading
+
+import psycopg2
+import psycopg2.extras
+from psycopg2.pool import ThreadedConnectionPool
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    # psycopg2's pool fails at once when every connection is out; wait up to timeout for one instead
+    def __init__(self, minconn, maxconn, timeout, **kwargs):
+        super().__init__(minconn, maxconn, **kwargs)
+        # minconn connections are opened up front; psycopg2 also closes any returned connection
+        # beyond minconn, so raise it now to keep up to maxconn idle ones for reuse
+        self.minconn = maxconn
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = timeout
+
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(f'No database connection free after {self.timeout} seconds')
+        try:
+            return super().getconn(key)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        # Connections left in a transaction are rolled back and closed ones discarded by the pool
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self.slots.release()
+
+
+def get_pool(alias, conn_params, options):
+    # One pool per database alias, process and set of connection parameters: gunicorn forks
+    # workers after importing the app, and the test runner points the alias at another database
+    key = (alias, os.getpid(), tuple(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = BlockingConnectionPool(options.get('MIN_SIZE', 1), options.get('MAX_SIZE', 10),
+                                                 options.get('TIMEOUT', 10), **conn_params)
+        return _pools[key]
+
+
+def close_pools(alias=None):
+    # Close this process's pools, or only the alias's; connections still borrowed are closed when returned
+    pid = os.getpid()
+    with _pools_lock:
+        for key in [key for key in _pools if key[1] == pid and alias in (None, key[0])]:
+            _pools.pop(key).closeall()
+
+
+atexit.register(close_pools)
+
+
+def is_usable(connection):
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # Leave no transaction open, Django switches the connection to autocommit next
+        connection.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def pool(self, conn_params=None):
+        return get_pool(self.alias, conn_params or self.get_connection_params(), self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool(conn_params)
+        connection = pool.getconn()
+        while not is_usable(connection):
+            # Dropped while idle; discarding it lets the pool open a fresh one once the idle ones run out
+            pool.putconn(connection, close=True)
+            connection = pool.getconn()
+        self.borrowed_from = pool
+        # As in the stock backend, which this skips by not calling Database.connect()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                if self.borrowed_from.closed:
+                    self.connection.close()
+                else:
+                    self.borrowed_from.putconn(self.connection)
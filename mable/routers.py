@@ -0,0 +1,24 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_DB_ALIAS = 'read'
+
+
+class ReadWriteRouter:
+    # Writes and migrations use 'default'; reads use the 'read' alias when DATABASE_READ_URL configures one
+    def db_for_read(self, model, **hints):
+        if READ_DB_ALIAS not in connections.databases:
+            return None
+        # Inside a transaction the writer's own uncommitted rows are only visible on its connection
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return READ_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
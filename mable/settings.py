@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 from pathlib import Path
 import os
 from django.conf import settings
+from mable.database import databases
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,6 +54,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'mable.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,8 +72,15 @@ TEMPLATES = [
         'DIRS': [
             BASE_DIR / 'templates'
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept for the life of the process (runserver still picks up
+            # edits); gunicorn.conf.py compiles the project's templates when each worker boots
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -88,14 +97,75 @@ WSGI_APPLICATION = 'mable.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+# SQLite (db.sqlite3) unless DATABASE_URL is set; see mable/database.py for the PostgreSQL
+# options. SQLite runs in WAL mode so a few workers can share it, but every write is still
+# serialized; beyond a small deployment use PostgreSQL.
+
+DATABASES = databases(BASE_DIR)
+
+# Only routes anything when DATABASE_READ_URL adds the 'read' alias
+DATABASE_ROUTERS = ['mable.routers.ReadWriteRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Local memory is per process. With several gunicorn workers, set CACHE_BACKEND=file or
+# CACHE_BACKEND=db (after `python manage.py createcachetable`) so they share cached ticket pages.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mable',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'mable_cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')],
+    # Kept apart so page fragments never push sessions out, and cache.clear() leaves them alone
+    'sessions': {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mable-sessions',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache' / 'sessions',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        },
+    }[os.environ.get('SESSION_CACHE_BACKEND', 'locmem')],
+}
+
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Sessions
+# https://docs.djangoproject.com/en/4.0/topics/http/sessions/
+# SESSION_BACKEND=cached_db reads sessions from the 'sessions' cache and only queries the
+# database on a miss. With several workers also set SESSION_CACHE_BACKEND=file, otherwise a
+# logout in one worker leaves the session cached in the others. SESSION_BACKEND=signed_cookies
+# keeps the session in the cookie and never queries the database, but a copied cookie stays
+# valid until it expires. Clear out expired database sessions with clear_expired_sessions.
+
+SESSION_BACKENDS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
 
+SESSION_ENGINE = SESSION_BACKENDS[os.environ.get('SESSION_BACKEND', 'db')]
+
+SESSION_CACHE_ALIAS = 'sessions'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -132,9 +202,12 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-# STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+# Build with `python manage.py collectstatic --noinput && python manage.py check_static_assets`:
+# assets are minified, hashed and precompressed into STATIC_ROOT (mable/storage.py) and served
+# by WhiteNoise with immutable caching.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
-# STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+STATICFILES_STORAGE = 'mable.storage.StaticStorage'
 
 STATICFILES_DIRS = [
         os.path.join(BASE_DIR, "static"),
@@ -144,6 +217,18 @@ STATICFILES_DIRS = [
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Chunked attachment uploads (tickets/uploads.py). Partial files are kept on the same
+# filesystem as MEDIA_ROOT so finished uploads are moved into place, not copied.
+ATTACHMENT_UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'uploads')
+ATTACHMENT_MAX_UPLOAD_SIZE = 2 * 1024 ** 3
+
+# Media is served by mable.media.serve_media after its access checks. Unset, the ASGI worker
+# streams every byte itself, so production should set one of these: behind nginx,
+# MEDIA_ACCEL_REDIRECT to an internal location aliased to MEDIA_ROOT (e.g. '/protected-media/');
+# behind Apache or lighttpd, MEDIA_X_SENDFILE = True.
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT') or None
+MEDIA_X_SENDFILE = False
+
 
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
@@ -152,7 +237,35 @@ LOGIN_REDIRECT_URL = 'home'
 
 LOGIN_URL = '/login/'
 
+# Let through by users.middleware.RequireLoginMiddleware without loading the session; the
+# login and register pages always are. URL names are reversed once at startup, entries
+# starting with / are path prefixes. Media is not exempt: profile pictures and avatars are only
+# shown to signed-in users, and mable.media.serve_media checks attachment access on top. The
+# notification stream authenticates from the session cookie.
+LOGIN_EXEMPT_URLS = [
+    STATIC_URL,
+    'health',
+    '/notifications/stream/',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Live notifications served by notifications.stream under ASGI.
+# BROKER is pluggable; the default fans out in-process and watches the table for new rows.
+NOTIFICATION_STREAM = {
+    'BROKER': 'notifications.live.DatabaseBroker',
+    'POLL_INTERVAL': 1.0,
+    'HEARTBEAT': 15,
+    'QUEUE_SIZE': 100,
+    'LONG_POLL_TIMEOUT': 25,
+}
+
+# Request metrics (mable/instrumentation.py), readable by staff at /instrumentation/.
+# Off unless INSTRUMENTATION_SAMPLE_RATE is set, e.g. 0.05 to measure one request in twenty.
+INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0)),
+    'DUPLICATE_THRESHOLD': 5,
+}
@@ -0,0 +1,24 @@
+"""
+SQLite backend tuned for several processes sharing db.sqlite3.
+
+Every new connection applies the PRAGMAS from its DATABASES entry (WAL journal,
+synchronous=NORMAL, mmap and a busy timeout by default, see mable/database.py).
+With TRANSACTION_MODE = 'IMMEDIATE', transactions take the write lock when they
+begin; a deferred transaction that reads first and writes later cannot wait for
+the lock and fails with "database is locked" as soon as another process has
+written in between.
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE', 'DEFERRED')
+        self.cursor().execute(f'BEGIN {mode}')
@@ -13,15 +13,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from .health import health
+from .instrumentation import instrumentation_metrics, instrumentation_report
+from .media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('users.urls')),
     path('', include('projects.urls')),
     path('', include('tickets.urls')),
-    path('', include('notifications.urls'),)
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('', include('notifications.urls'),),
+    path('health/', health, name='health'),
+    path('instrumentation/', instrumentation_report, name='instrumentation-report'),
+    path('instrumentation/metrics', instrumentation_metrics, name='instrumentation-metrics'),
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
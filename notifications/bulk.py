@@ -0,0 +1,19 @@
+from .models import Notification
+from .cache import invalidate
+
+
+def mark_read(recipient, ids=None, until=None):
+    # Mark the recipient's unread notifications as read in one UPDATE, optionally only the
+    # given ids or those created up to a timestamp; returns (rows updated, unread left)
+    notifications = Notification.objects.filter(recipient=recipient, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    if until is not None:
+        notifications = notifications.filter(created__lte=until)
+
+    updated = notifications.update(is_read=True)
+    if updated:
+        invalidate(recipient.pk)
+
+    unread = Notification.objects.filter(recipient=recipient, is_read=False).count()
+    return updated, unread
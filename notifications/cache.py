@@ -0,0 +1,33 @@
+from django.core.cache import cache
+
+from .models import Notification
+
+# How many unread notifications the navbar dropdown shows
+LATEST_COUNT = 10
+
+# Entries are invalidated on every notification write in this process; the timeout bounds
+# how stale another worker's local-memory copy can get
+CACHE_TIMEOUT = 60
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_summary(user_id):
+    # {'count': unread total, 'latest': newest unread notifications} for the navbar
+    summary = cache.get(cache_key(user_id))
+    if summary is None:
+        unread = (Notification.objects.filter(recipient_id=user_id, is_read=False)
+                  .only('id', 'message', 'notification_type', 'ticket_id', 'created')
+                  .order_by('-created', '-id'))
+        latest = list(unread[:LATEST_COUNT])
+        count = len(latest) if len(latest) < LATEST_COUNT else unread.count()
+        summary = {'count': count, 'latest': latest}
+        cache.set(cache_key(user_id), summary, CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate(user_id):
+    if user_id is not None:
+        cache.delete(cache_key(user_id))
@@ -1,10 +1,14 @@
-from .models import Notification
+from django.utils.functional import SimpleLazyObject
+
+from .cache import unread_summary
 
 def notifications(request):
-    if request.user.is_authenticated:
-        notifications = Notification.objects.filter(recipient=request.user, is_read=False).select_related('ticket')
-        count = notifications.count()
+    if request.user.is_authenticated and request.user.pk:
+        # Nothing is fetched unless the template actually reads one of these
+        summary = SimpleLazyObject(lambda: unread_summary(request.user.pk))
+        notifications = SimpleLazyObject(lambda: summary['latest'])
+        count = SimpleLazyObject(lambda: summary['count'])
     else:
         notifications = []
         count = 0
-    return {'notifications': notifications, 'count': count}
\ No newline at end of file
+    return {'notifications': notifications, 'count': count}
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .models import Notification
+
+DEFAULTS = {
+    'BROKER': 'notifications.live.DatabaseBroker',
+    # Seconds between checks for new notification rows, one query per process
+    'POLL_INTERVAL': 1.0,
+    # Seconds of silence before a heartbeat comment keeps proxies from closing the stream
+    'HEARTBEAT': 15,
+    # Events buffered per connection before a slow client is told to resync
+    'QUEUE_SIZE': 100,
+    'LONG_POLL_TIMEOUT': 25,
+    'REPLAY_LIMIT': 50,
+}
+
+# Queued in place of the backlog when a client cannot keep up
+RESYNC = {'event': 'resync'}
+
+
+def stream_setting(name):
+    return getattr(settings, 'NOTIFICATION_STREAM', {}).get(name, DEFAULTS[name])
+
+
+def serialize(row):
+    return {
+        'id': row['id'],
+        'message': row['message'],
+        'notification_type': row['notification_type'],
+        'url': reverse('ticket', args=[row['ticket_id']]) if row['ticket_id'] else None,
+        'created': row['created'].isoformat(),
+    }
+
+
+def notifications_after(after_id, recipient_id=None, limit=None):
+    rows = Notification.objects.filter(id__gt=after_id, is_read=False).order_by('id')
+    if recipient_id is not None:
+        rows = rows.filter(recipient_id=recipient_id)
+    rows = rows.values('id', 'recipient_id', 'message', 'notification_type', 'ticket_id', 'created')
+    return list(rows[:limit or stream_setting('REPLAY_LIMIT')])
+
+
+def unread_counts(user_ids):
+    # Read from the table rather than the cache, which is per process and may be stale here
+    counts = dict.fromkeys(user_ids, 0)
+    rows = (Notification.objects.filter(recipient_id__in=user_ids, is_read=False)
+            .order_by().values('recipient_id').annotate(count=Count('id')))
+    for row in rows:
+        counts[row['recipient_id']] = row['count']
+    return counts
+
+
+def latest_notification_id():
+    return Notification.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+class Subscription:
+    # One connected browser; owned by the event loop that created it
+    def __init__(self, user_id, queue_size, after=None):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.loop = asyncio.get_running_loop()
+        # The newest notification id the browser already has, from its initial state or an earlier event
+        self.last_id = after
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Backpressure: drop the backlog instead of growing without bound, the client refetches its count
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class InProcessBroker:
+    # Fans published events out to the subscriptions held by this process
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, user_id, after=None):
+        subscription = Subscription(user_id, stream_setting('QUEUE_SIZE'), after)
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.user_id, None)
+
+    def subscribed_users(self):
+        with self.lock:
+            return list(self.subscriptions)
+
+    def all_subscriptions(self):
+        with self.lock:
+            return [subscription for subscriptions in self.subscriptions.values() for subscription in subscriptions]
+
+    def publish(self, user_id, event):
+        # Safe to call from any thread
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.push, event)
+
+
+class DatabaseBroker(InProcessBroker):
+    # Notifications are written by the outbox worker in another process, so each web process
+    # watches the table for new ids once and fans them out to every local connection. Each
+    # subscription resumes after its own last id, so a row is neither missed while the poller
+    # was stopped or catching up nor delivered twice
+    def __init__(self):
+        super().__init__()
+        self.task = None
+
+    def subscribe(self, user_id, after=None):
+        subscription = super().subscribe(user_id, after)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        if not self.subscribed_users() and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        while True:
+            await self.poll()
+            await asyncio.sleep(stream_setting('POLL_INTERVAL'))
+
+    async def poll(self):
+        subscriptions = self.all_subscriptions()
+        if not subscriptions:
+            return 0
+        fresh = [subscription for subscription in subscriptions if subscription.last_id is None]
+        if fresh:
+            # Subscribed without a starting point: only what arrives from now on
+            latest = await sync_to_async(latest_notification_id)()
+            for subscription in fresh:
+                subscription.last_id = latest
+
+        after = min(subscription.last_id for subscription in subscriptions)
+        rows = await sync_to_async(notifications_after)(after, limit=1000)
+        if not rows:
+            return 0
+
+        pending = {}
+        for subscription in subscriptions:
+            new = [row for row in rows if row['recipient_id'] == subscription.user_id and row['id'] > subscription.last_id]
+            if new:
+                pending[subscription] = new
+            subscription.last_id = max(subscription.last_id, rows[-1]['id'])
+        if not pending:
+            return 0
+
+        counts = await sync_to_async(unread_counts)({subscription.user_id for subscription in pending})
+        delivered = set()
+        for subscription, new in pending.items():
+            for row in new:
+                event = {'event': 'notification', 'id': row['id'], 'data': serialize(row)}
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+                delivered.add(row['id'])
+            count = {'event': 'count', 'data': {'unread_count': counts[subscription.user_id]}}
+            subscription.loop.call_soon_threadsafe(subscription.push, count)
+        return len(delivered)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(stream_setting('BROKER'))()
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import drain
+
+
+class Command(BaseCommand):
+    help = 'Fan ticket events from the notification outbox out to hosts, assignees and participants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--settle', type=float, default=2.0,
+                            help='Leave events younger than this many seconds for the next pass, so bursts of '
+                                 'updates to one ticket coalesce into one notification')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            total = drain(batch_size=options['batch_size'], settle=0)
+            self.stdout.write(self.style.SUCCESS(f'Processed {total} notification event(s)'))
+            return
+
+        self.stdout.write('Processing the notification outbox, press Ctrl+C to stop')
+        try:
+            while True:
+                total = drain(batch_size=options['batch_size'], settle=options['settle'])
+                if total:
+                    self.stdout.write(f'Processed {total} notification event(s)')
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
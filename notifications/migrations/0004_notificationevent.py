@@ -0,0 +1,27 @@
+# Generated by Django 4.1.5 on 2026-10-18 14:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_searchdocument'),
+        ('notifications', '0003_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('created', 'created'), ('updated', 'updated')], max_length=15)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_events', to='tickets.ticket')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -14,4 +14,20 @@ class Notification(models.Model):
     message = models.TextField()
     notification_type = models.CharField(choices=OPTIONS, max_length=15, null=True)
     is_read = models.BooleanField(default=False)
-    created = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # Unread counts, the navbar list and the bulk mark-read updates all filter on these
+            models.Index(fields=['recipient', 'is_read', 'created'], name='notification_unread_idx'),
+        ]
+
+
+class NotificationEvent(models.Model):
+    # Outbox row written alongside a ticket change; process_notification_outbox fans it out into notifications
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='notification_events')
+    event_type = models.CharField(choices=Notification.OPTIONS, max_length=15)
+    created = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
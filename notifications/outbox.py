@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from tickets.models import Ticket
+from .models import Notification, NotificationEvent
+from .cache import invalidate
+
+MESSAGES = {
+    'host': 'Your ticket has been {event}',
+    'assignee': 'A ticket assigned to you has been {event}',
+    'participant': 'A ticket you commented on has been {event}',
+}
+
+
+def enqueue(ticket, event_type):
+    # Called from post_save; the create and update views save inside transaction.atomic(), so
+    # the event commits or rolls back with the ticket. Saves outside a transaction commit it separately
+    NotificationEvent.objects.create(ticket=ticket, event_type=event_type)
+
+
+def coalesce(events):
+    # One event per ticket: a burst of updates becomes a single update, and a ticket created
+    # in the same batch only announces its creation
+    pending = {}
+    for event in events:
+        if pending.get(event.ticket_id) != 'created':
+            pending[event.ticket_id] = event.event_type
+    return pending
+
+
+def recipients(ticket_ids):
+    # {ticket_id: {user_id: role}} for host, assignees and participants, without loading users
+    roles = {ticket_id: {} for ticket_id in ticket_ids}
+    through_tables = [
+        (Ticket.participants.through, 'participant'),
+        (Ticket.assignee.through, 'assignee'),
+    ]
+    for through, role in through_tables:
+        for ticket_id, user_id in through.objects.filter(ticket_id__in=ticket_ids).values_list('ticket_id', 'customuser_id'):
+            roles[ticket_id][user_id] = role
+    for ticket_id, host_id in Ticket.objects.filter(id__in=ticket_ids).values_list('id', 'host_id'):
+        if host_id is not None:
+            roles[ticket_id][host_id] = 'host'
+    return roles
+
+
+def process_batch(batch_size=500, settle=0):
+    # Turn up to batch_size outbox events into notifications; returns how many events were consumed
+    cutoff = timezone.now() - timedelta(seconds=settle)
+    notified = set()
+
+    with transaction.atomic():
+        events = NotificationEvent.objects.filter(created__lte=cutoff).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the outbox without handing out the same events twice
+            events = events.select_for_update(skip_locked=True)
+        events = list(events[:batch_size])
+        if not events:
+            return 0
+
+        pending = coalesce(events)
+        notifications = []
+        for ticket_id, users in recipients(list(pending)).items():
+            for user_id, role in users.items():
+                notifications.append(Notification(
+                    recipient_id=user_id,
+                    ticket_id=ticket_id,
+                    message=MESSAGES[role].format(event=pending[ticket_id]),
+                    notification_type=pending[ticket_id],
+                ))
+                notified.add(user_id)
+
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).delete()
+
+    # bulk_create skips post_save, so drop the cached navbar summaries here
+    for user_id in notified:
+        invalidate(user_id)
+    return len(events)
+
+
+def drain(batch_size=500, settle=0):
+    total = 0
+    while True:
+        processed = process_batch(batch_size=batch_size, settle=settle)
+        total += processed
+        if processed < batch_size:
+            return total
@@ -1,17 +1,25 @@
 from users.models import CustomUser
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from tickets.models import Ticket
 from notifications.models import Notification
+from notifications.cache import invalidate
+from notifications.outbox import enqueue
 
 @receiver(post_save, sender=Ticket)
 def create_ticket_notification(sender, instance, created, **kwargs):
     if created:
-        Notification.objects.create(recipient=instance.host, ticket=instance, message='Your ticket has been created', notification_type='created')
+        enqueue(instance, 'created')
         
         
 @receiver(post_save, sender=Ticket)
 def update_ticket_notification(sender, instance, created, **kwargs):
     if not created:
-        Notification.objects.create(recipient=instance.host, ticket=instance, message='Your ticket has been updated', notification_type='updated')
\ No newline at end of file
+        enqueue(instance, 'updated')
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_unread_notifications(sender, instance, **kwargs):
+    invalidate(instance.recipient_id)
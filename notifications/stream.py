@@ -0,0 +1,152 @@
+import asyncio
+import io
+import json
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.handlers.asgi import ASGIRequest
+
+from .live import (RESYNC, get_broker, latest_notification_id, notifications_after, serialize, stream_setting,
+                   unread_counts)
+
+# Served straight from mable/asgi.py, outside the Django request cycle, so an idle
+# connection costs a queue and a coroutine rather than a worker thread
+STREAM_PATH = '/notifications/stream/'
+
+
+def request_user_id(request):
+    # The session and auth middleware never run for this endpoint, so resolve the user the same way they do
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    user = auth.get_user(request)
+    return user.pk if user.is_authenticated else None
+
+
+def unread_count(user_id):
+    return unread_counts([user_id])[user_id]
+
+
+def format_event(event):
+    lines = []
+    if 'id' in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event.get('data', {}))}")
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+async def send_json(send, status, data):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'cache-control', b'no-cache')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def event_stream(user_id, request, receive, send):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # Stop nginx from buffering the stream
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def emit(data):
+        await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+    broker = get_broker()
+    # Taken before the initial state is read: the broker sends everything newer, the replay everything older
+    high_water = await sync_to_async(latest_notification_id)()
+    subscription = broker.subscribe(user_id, after=high_water)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await emit(b'retry: 5000\n\n')
+
+        # EventSource sends the last id it saw when it reconnects, replay what it missed
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        if last_event_id.isdigit():
+            for row in await sync_to_async(notifications_after)(int(last_event_id), user_id):
+                if row['id'] <= high_water:
+                    await emit(format_event({'event': 'notification', 'id': row['id'], 'data': serialize(row)}))
+        count = await sync_to_async(unread_count)(user_id)
+        await emit(format_event({'event': 'count', 'data': {'unread_count': count}}))
+
+        while True:
+            next_event = asyncio.ensure_future(subscription.queue.get())
+            done, pending = await asyncio.wait(
+                {next_event, disconnect},
+                timeout=stream_setting('HEARTBEAT'),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                next_event.cancel()
+                return
+            if next_event not in done:
+                next_event.cancel()
+                await emit(b': heartbeat\n\n')
+                continue
+
+            event = next_event.result()
+            if event is RESYNC:
+                count = await sync_to_async(unread_count)(user_id)
+                event = {'event': 'resync', 'data': {'unread_count': count}}
+            await emit(format_event(event))
+    finally:
+        broker.unsubscribe(subscription)
+        disconnect.cancel()
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+async def long_poll(user_id, request, send):
+    # Fallback for clients without EventSource: answer as soon as something new arrives or on timeout
+    try:
+        after = int(request.GET.get('after') or 0)
+    except ValueError:
+        return await send_json(send, 400, {'error': 'after must be a notification id'})
+
+    broker = get_broker()
+    # Subscribe before reading the table, from the newest id so far, so nothing slips in between the two
+    high_water = await sync_to_async(latest_notification_id)()
+    subscription = broker.subscribe(user_id, after=high_water)
+    try:
+        rows = await sync_to_async(notifications_after)(after, user_id)
+        notifications = [serialize(row) for row in rows]
+        if not notifications:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), stream_setting('LONG_POLL_TIMEOUT'))
+                events = [event]
+                while not subscription.queue.empty():
+                    events.append(subscription.queue.get_nowait())
+            except asyncio.TimeoutError:
+                events = []
+            notifications = [event['data'] for event in events if event.get('event') == 'notification']
+    finally:
+        broker.unsubscribe(subscription)
+
+    count = await sync_to_async(unread_count)(user_id)
+    await send_json(send, 200, {'notifications': notifications, 'unread_count': count})
+
+
+async def notification_stream(scope, receive, send):
+    request = ASGIRequest(scope, io.BytesIO())
+    user_id = await sync_to_async(request_user_id)(request)
+    if user_id is None:
+        return await send_json(send, 401, {'error': 'Authentication required'})
+
+    if request.GET.get('mode') == 'poll':
+        return await long_poll(user_id, request, send)
+    return await event_stream(user_id, request, receive, send)
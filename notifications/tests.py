@@ -1,11 +1,23 @@
+import asyncio
+import json
+from unittest import mock
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
 from django.test import TestCase, RequestFactory
 from users.models import CustomUser
 from django.urls import reverse
-from .models import Notification
+from .models import Notification, NotificationEvent
 from tickets.models import Ticket
+from projects.models import Project
 from . views import view_notifications, mark_notification_as_read
 from .signals import create_ticket_notification, update_ticket_notification
 from .context_processors import notifications
+from .cache import unread_summary
+from .outbox import process_batch
+from .live import DatabaseBroker, InProcessBroker, RESYNC, get_broker, latest_notification_id
+from .stream import STREAM_PATH, notification_stream
+from django.core.cache import cache
 
 # Create your tests here.
 class NotificationTestCase(TestCase):
@@ -70,3 +82,237 @@ class NotificationTestCase(TestCase):
         response = notifications(request)
         self.assertEqual(len(response['notifications']), 0)
         self.assertEqual(response['count'], 0)
+
+
+class NotificationCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = CustomUser.objects.create_user(username='cacheuser', password='testpassword')
+        for i in range(3):
+            Notification.objects.create(recipient=self.user, message=f'Notification {i}', notification_type='created')
+            
+    def test_context_processor_is_lazy(self):
+        request = self.factory.get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            context = notifications(request)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(context['count'], 3)
+            self.assertEqual(len(context['notifications']), 3)
+            
+    def test_summary_is_cached_until_a_notification_changes(self):
+        unread_summary(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_summary(self.user.pk)['count'], 3)
+        
+        # Creating a notification invalidates the entry
+        Notification.objects.create(recipient=self.user, message='New one', notification_type='updated')
+        summary = unread_summary(self.user.pk)
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['latest'][0].message, 'New one')
+        
+        # So does reading one
+        notification = Notification.objects.filter(recipient=self.user).first()
+        notification.is_read = True
+        notification.save()
+        self.assertEqual(unread_summary(self.user.pk)['count'], 3)
+
+
+class BulkMarkReadTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='bulkuser', password='testpassword')
+        self.other = CustomUser.objects.create_user(username='otheruser', password='testpassword')
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, message=f'Notification {i}') for i in range(5)
+        ]
+        self.foreign = Notification.objects.create(recipient=self.other, message='Not yours')
+        self.client.login(username='bulkuser', password='testpassword')
+        self.url = reverse('mark_notifications_as_read')
+        
+    def test_mark_all_read_is_one_update(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.json(), {'success': True, 'updated': 5, 'unread_count': 0})
+        self.assertFalse(Notification.objects.filter(recipient=self.user, is_read=False).exists())
+        
+        # Other recipients are untouched
+        self.foreign.refresh_from_db()
+        self.assertFalse(self.foreign.is_read)
+        
+    def test_mark_selected_ids(self):
+        ids = [self.notifications[0].id, self.notifications[1].id, self.foreign.id]
+        response = self.client.post(self.url, json.dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'updated': 2, 'unread_count': 3})
+        
+    def test_mark_read_until_timestamp(self):
+        cutoff = self.notifications[2].created
+        Notification.objects.filter(id__in=[n.id for n in self.notifications[3:]]).update(created=cutoff + timedelta(minutes=1))
+        response = self.client.post(self.url, {'until': cutoff.isoformat()})
+        self.assertEqual(response.json()['unread_count'], 2)
+        
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.post(self.url, {'until': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'ids': ['a']}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        
+        # JSON bodies must carry the right types, not just parse
+        for body in ({'ids': '12'}, {'ids': 12}, {'until': 20240101}, [1, 2]):
+            response = self.client.post(self.url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertFalse(Notification.objects.filter(is_read=True).exists())
+        
+    def test_view_notifications_marks_everything_read(self):
+        response = self.client.get(reverse('view_notifications'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['count'], 5)
+        self.assertFalse(Notification.objects.filter(recipient=self.user, is_read=False).exists())
+        
+    def test_single_mark_read_is_scoped_to_recipient(self):
+        response = self.client.post(reverse('mark_notification_as_read', args=[self.foreign.id]))
+        self.assertEqual(response.status_code, 404)
+        self.foreign.refresh_from_db()
+        self.assertFalse(self.foreign.is_read)
+
+
+class NotificationOutboxTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = CustomUser.objects.create_user(username='outboxhost', password='testpassword')
+        self.assignee = CustomUser.objects.create_user(username='outboxassignee', password='testpassword')
+        self.participant = CustomUser.objects.create_user(username='outboxparticipant', password='testpassword')
+        self.project = Project.objects.create(name='Outbox project')
+        self.ticket = Ticket.objects.create(name='Outbox ticket', host=self.host, project=self.project)
+        self.ticket.assignee.add(self.assignee)
+        self.ticket.participants.add(self.participant)
+        
+    def test_saving_a_ticket_only_writes_the_outbox(self):
+        self.assertEqual(NotificationEvent.objects.filter(ticket=self.ticket).count(), 1)
+        self.assertFalse(Notification.objects.exists())
+        
+    def test_worker_notifies_host_assignees_and_participants(self):
+        process_batch()
+        notifications = Notification.objects.filter(ticket=self.ticket)
+        self.assertEqual(
+            {(n.recipient_id, n.notification_type) for n in notifications},
+            {(self.host.id, 'created'), (self.assignee.id, 'created'), (self.participant.id, 'created')},
+        )
+        self.assertFalse(NotificationEvent.objects.exists())
+        
+    def test_rapid_updates_are_coalesced(self):
+        process_batch()
+        for i in range(5):
+            self.ticket.name = f'Outbox ticket {i}'
+            self.ticket.save()
+        self.assertEqual(process_batch(), 5)
+        updates = Notification.objects.filter(notification_type='updated')
+        self.assertEqual(updates.filter(recipient=self.host).count(), 1)
+        self.assertEqual(updates.count(), 3)
+        
+    def test_worker_invalidates_cached_summaries(self):
+        self.assertEqual(unread_summary(self.host.pk)['count'], 0)
+        process_batch()
+        self.assertEqual(unread_summary(self.host.pk)['count'], 1)
+        
+    def test_failed_event_rolls_back_the_ticket(self):
+        self.client.login(username='outboxhost', password='testpassword')
+        with mock.patch('notifications.outbox.NotificationEvent.objects.create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('create-ticket'), {
+                    'name': 'Rolled back', 'category': 'Outbox', 'project': self.project.id,
+                    'status': 'True', 'priority': 'Low', 'type': 'Bug', 'description': 'x',
+                })
+        self.assertFalse(Ticket.objects.filter(name='Rolled back').exists())
+        
+    def test_settle_leaves_fresh_events_for_later(self):
+        self.assertEqual(process_batch(settle=60), 0)
+        self.assertEqual(NotificationEvent.objects.count(), 1)
+
+
+class NotificationStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='streamuser', password='testpassword')
+        self.client.login(username='streamuser', password='testpassword')
+        self.cookie = f'sessionid={self.client.cookies["sessionid"].value}'.encode()
+        
+    def scope(self, query_string=b'', cookie=True):
+        headers = [(b'cookie', self.cookie)] if cookie else []
+        return {'type': 'http', 'method': 'GET', 'path': STREAM_PATH, 'query_string': query_string, 'headers': headers}
+        
+    async def test_stream_requires_login(self):
+        communicator = ApplicationCommunicator(notification_stream, self.scope(cookie=False))
+        start = await communicator.receive_output()
+        self.assertEqual(start['status'], 401)
+        
+    async def test_stream_sends_count_then_published_notifications(self):
+        communicator = ApplicationCommunicator(notification_stream, self.scope())
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output()
+        self.assertEqual(dict(start['headers'])[b'content-type'], b'text/event-stream')
+        self.assertEqual((await communicator.receive_output())['body'], b'retry: 5000\n\n')
+        self.assertIn(b'"unread_count": 0', (await communicator.receive_output())['body'])
+        
+        get_broker().publish(self.user.pk, {'event': 'notification', 'id': 7, 'data': {'message': 'Live'}})
+        body = (await communicator.receive_output())['body']
+        self.assertIn(b'id: 7\nevent: notification', body)
+        self.assertIn(b'"message": "Live"', body)
+        
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait()
+        self.assertEqual(get_broker().subscribed_users(), [])
+        
+    async def test_long_poll_returns_unread_notifications_after_id(self):
+        await Notification.objects.acreate(recipient=self.user, message='Waiting', notification_type='created')
+        communicator = ApplicationCommunicator(notification_stream, self.scope(b'mode=poll&after=0'))
+        start = await communicator.receive_output()
+        self.assertEqual(start['status'], 200)
+        data = json.loads((await communicator.receive_output())['body'])
+        self.assertEqual([n['message'] for n in data['notifications']], ['Waiting'])
+        self.assertEqual(data['unread_count'], 1)
+        
+    async def test_database_broker_publishes_new_rows(self):
+        broker = get_broker()
+        subscription = broker.subscribe(self.user.pk)
+        try:
+            await broker.poll()
+            await Notification.objects.acreate(recipient=self.user, message='Polled', notification_type='updated')
+            self.assertEqual(await broker.poll(), 1)
+            await asyncio.sleep(0)
+            events = [subscription.queue.get_nowait() for i in range(subscription.queue.qsize())]
+            self.assertEqual([event['event'] for event in events], ['notification', 'count'])
+            self.assertEqual(events[0]['data']['message'], 'Polled')
+        finally:
+            broker.unsubscribe(subscription)
+            
+    async def test_rows_between_initial_state_and_first_poll_are_sent(self):
+        class ManualBroker(DatabaseBroker):
+            # Polled by the test alone
+            async def run(self):
+                pass
+                
+        broker = ManualBroker()
+        # The stream reads its high-water mark before the initial count; the poller has not run yet
+        high_water = await sync_to_async(latest_notification_id)()
+        subscription = broker.subscribe(self.user.pk, after=high_water)
+        try:
+            await Notification.objects.acreate(recipient=self.user, message='Early', notification_type='updated')
+            self.assertEqual(await broker.poll(), 1)
+            # A second subscriber starting later does not get it again, nor does the first
+            later = broker.subscribe(self.user.pk, after=await sync_to_async(latest_notification_id)())
+            self.assertEqual(await broker.poll(), 0)
+            broker.unsubscribe(later)
+            await asyncio.sleep(0)
+            events = [subscription.queue.get_nowait() for i in range(subscription.queue.qsize())]
+            self.assertEqual([event['event'] for event in events], ['notification', 'count'])
+            self.assertEqual(events[0]['data']['message'], 'Early')
+        finally:
+            broker.unsubscribe(subscription)
+            
+    async def test_slow_subscriber_is_told_to_resync(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(self.user.pk)
+        for i in range(subscription.queue.maxsize + 1):
+            subscription.push({'event': 'count', 'data': {'unread_count': i}})
+        self.assertEqual(subscription.queue.qsize(), 1)
+        self.assertIs(subscription.queue.get_nowait(), RESYNC)
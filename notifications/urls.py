@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('notifications/', views.view_notifications, name='view_notifications'),
     path('mark_notification_as_read/<int:notification_id>/', views.mark_notification_as_read, name='mark_notification_as_read'),
+    path('mark_notifications_as_read/', views.mark_notifications_as_read, name='mark_notifications_as_read'),
 ]
\ No newline at end of file
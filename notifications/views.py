@@ -1,25 +1,66 @@
+import json
+
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404
+from django.http import JsonResponse, Http404
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
 from .models import Notification
+from .bulk import mark_read
+from .cache import invalidate, LATEST_COUNT
 
 # Create your views here.
 def view_notifications(request):
-    notifications = Notification.objects.filter(recipient=request.user, read=False)
-    count = notifications.filter(is_read=False).count()
-
-    for notification in notifications:
-        if not notification.is_read:
-            notification.is_read = True
-            notification.save()
-    
+    # Show the newest unread notifications, then mark all of them read with a single UPDATE
+    notifications = list(
+        Notification.objects.filter(recipient=request.user, is_read=False)
+        .order_by('-created', '-id')[:LATEST_COUNT]
+    )
+    count = mark_read(request.user)[0]
 
     context = {'notifications': notifications, 'count': count}
     return render(request, 'navbar.html', context)
 
 def mark_notification_as_read(request, notification_id):
-    notification = get_object_or_404(Notification, id=notification_id)
-    notification.is_read = True
-    notification.save()
+    updated = Notification.objects.filter(id=notification_id, recipient=request.user).update(is_read=True)
+    if not updated:
+        raise Http404('No Notification matches the given query.')
+    invalidate(request.user.pk)
     response_data = {'success': True}
-    return JsonResponse(response_data)
\ No newline at end of file
+    return JsonResponse(response_data)
+
+@require_POST
+def mark_notifications_as_read(request):
+    # Bulk mark-read: every unread notification, or only the posted `ids`, or those created up to `until`
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or '{}')
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'success': False, 'error': 'Expected a JSON object'}, status=400)
+        ids = data.get('ids')
+        until = data.get('until')
+        # A string would be read one character at a time below, and parse_datetime needs a string
+        if ids is not None and not isinstance(ids, list):
+            return JsonResponse({'success': False, 'error': 'ids must be a list'}, status=400)
+        if until is not None and not isinstance(until, str):
+            return JsonResponse({'success': False, 'error': 'until must be an ISO 8601 timestamp'}, status=400)
+    else:
+        ids = request.POST.getlist('ids') or None
+        until = request.POST.get('until')
+
+    if ids is not None:
+        try:
+            ids = [int(notification_id) for notification_id in ids]
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'ids must be integers'}, status=400)
+
+    if until:
+        until = parse_datetime(until)
+        if until is None:
+            return JsonResponse({'success': False, 'error': 'until must be an ISO 8601 timestamp'}, status=400)
+    else:
+        until = None
+
+    updated, unread = mark_read(request.user, ids=ids, until=until)
+    return JsonResponse({'success': True, 'updated': updated, 'unread_count': unread})
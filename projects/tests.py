@@ -4,6 +4,7 @@ from projects.models import Project
 from tickets.models import Ticket
 from users.models import CustomUser
 from projects.forms import ProjectForm
+from tickets.testing import TicketListingMixin
 
 # Create your tests here.
 
@@ -278,4 +279,12 @@ class DeleteProjectIntegrationTest(TestCase):
         # Test that a project is not deleted with an invalid POST request while logged in
         url = reverse('delete-project', args=[10000])
         response = self.client.post(url)
-        self.assertEqual(response.status_code, 404)
\ No newline at end of file
+        self.assertEqual(response.status_code, 404)
+
+
+class ProjectTicketListingQueryTest(TicketListingMixin, TestCase):
+    def setUp(self):
+        self.set_up_listing()
+        
+    def test_project_query_count(self):
+        self.assertListingQueriesConstant(reverse('project', args=[self.project.id]))
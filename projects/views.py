@@ -1,26 +1,26 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from .models import Project
-from django.core.paginator import Paginator
+from tickets.pagination import CursorPaginator
 from .forms import ProjectForm
 from django.db.models import Q
 from tickets.models import Ticket
+from tickets.search import search_tickets
 
 # Create your views here.
 def project_home(request):
-    projects = Project.objects.all()
+    projects = Project.objects.order_by('-updated', '-created')
     search_query = request.GET.get('search')
     if search_query:    
-        projects = Project.objects.filter(
+        projects = projects.filter(
             Q(name__icontains=search_query) |
             Q(description__icontains=search_query)
     )
     
         
     
-    paginator = Paginator(projects, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(projects, 5)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {'projects': projects, 
                'page_obj': page_obj, 
@@ -30,27 +30,18 @@ def project_home(request):
 def project(request, pk):
     projects = Project.objects.get(id=pk)
     search_query = request.GET.get('search')
-    tickets = Ticket.objects.filter(project=projects)
+    tickets = Ticket.objects.for_listing().filter(project=projects)
     
     if request.method == 'POST':
         return redirect('project', pk=project.id)
     
     # Search functionality
     if search_query:
-        tickets = tickets.filter(
-            
-            Q(assignee__username__icontains=search_query) |
-            Q(category__name__icontains=search_query) |
-            Q(name__icontains=search_query) |
-            Q(status__iexact=search_query) |
-            Q(priority__icontains=search_query) |
-            Q(type__icontains=search_query)
-        )
+        tickets = search_tickets(tickets, search_query)
     
     # Paginate the ticket table
-    paginator = Paginator(tickets, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(tickets, 5, estimate=True)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {'projects': projects, 
                'tickets': tickets,
@@ -1,17 +1,17 @@
-// Ticket Priority Pie Chart
+// Ticket Priority, Type and Status Charts
 
-// Make an AJAX call to retrieve data
-  // Make an AJAX call to retrieve data
-  $.ajax({
-    url: '/ticket_data/',
+// Make one AJAX call to retrieve the data for all three charts
+$.ajax({
+    url: '/stats/',
     success: function(data) {
-      var ctx = document.getElementById('priority-pie-chart').getContext('2d');
-      var myChart = new Chart(ctx, {
+      // Ticket Priority Pie Chart
+      var priorityCtx = document.getElementById('priority-pie-chart').getContext('2d');
+      var priorityChart = new Chart(priorityCtx, {
         type: 'pie',
         data: {
-          labels: ['High', 'Medium', 'Low', 'None'],
+          labels: data.priority.labels,
           datasets: [{
-            data: data.values,
+            data: data.priority.values,
             backgroundColor: [
               'rgba(255, 99, 132, 0.8)',
               'rgba(54, 162, 235, 0.8)',
@@ -27,22 +27,15 @@
           }
         }
       });
-    }
-  });
 
-
-// Ticket Type Doughnut chart
-
-$.ajax({
-    url: '/type_data/',
-    success: function(data) {
-      var ctx = document.getElementById('donut-chart').getContext('2d');
-      var myChart = new Chart(ctx, {
+      // Ticket Type Doughnut chart
+      var typeCtx = document.getElementById('donut-chart').getContext('2d');
+      var typeChart = new Chart(typeCtx, {
         type: 'doughnut',
         data: {
-          labels: ['Misc', 'Bug', 'Help Needed', 'Concern', 'Question'],
+          labels: data.type.labels,
           datasets: [{
-            data: data.values,
+            data: data.type.values,
             backgroundColor: [
               'rgba(255, 99, 132, 0.8)',
               'rgba(54, 162, 235, 0.8)',
@@ -59,21 +52,15 @@ $.ajax({
           }
         }
       });
-    }
-  });
 
-
-// Ticket Status Pie Chart
-$.ajax({
-    url: '/status_data/',
-    success: function(data) {
-      var ctx = document.getElementById('status-pie-chart').getContext('2d');
-      var myChart = new Chart(ctx, {
+      // Ticket Status Pie Chart
+      var statusCtx = document.getElementById('status-pie-chart').getContext('2d');
+      var statusChart = new Chart(statusCtx, {
         type: 'pie',
         data: {
-          labels: ['Open', 'Closed'],
+          labels: data.status.labels,
           datasets: [{
-            data: data.values,
+            data: data.status.values,
             backgroundColor: [
               'rgba(54, 162, 235, 0.8)',
               'rgba(255, 99, 132, 0.8)',
@@ -155,9 +155,109 @@ function markAsRead(element) {
 	})
 	.catch(error => console.error(error));
 }
+
+// Live notifications pushed over server-sent events (served by mable/asgi.py)
+function setNotificationCount(count) {
+	var badge = document.querySelector('.nav-link .badge');
+	if (badge) {
+		badge.textContent = count;
+	}
+}
+
+function addNotification(notification) {
+	var dropdown = document.getElementById('myDropdown');
+	if (!dropdown || !notification.url) {
+		return;
+	}
+	// Drop the "No new notifications" placeholder
+	dropdown.querySelectorAll('.notification-link:not([data-notification-id])').forEach(link => link.remove());
+
+	var link = document.createElement('a');
+	link.href = notification.url;
+	link.className = 'notification-link';
+	link.setAttribute('data-notification-id', notification.id);
+	link.textContent = notification.message;
+	link.setAttribute('onclick', 'markAsRead(this)');
+	dropdown.prepend(link);
+}
+
+if (window.EventSource && document.getElementById('myDropdown')) {
+	var notificationStream = new EventSource('/notifications/stream/');
+	notificationStream.addEventListener('notification', event => addNotification(JSON.parse(event.data)));
+	notificationStream.addEventListener('count', event => setNotificationCount(JSON.parse(event.data).unread_count));
+	notificationStream.addEventListener('resync', event => setNotificationCount(JSON.parse(event.data).unread_count));
+}
 // NOTIFICATION DROPDOWN END
 
 
+// CHUNKED ATTACHMENT UPLOADS
+// Files are sent in slices to the resumable upload endpoint; the plain form post is the fallback
+const UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024;
+
+function uploadRequest(url, options) {
+	var csrfToken = document.getElementsByName('csrfmiddlewaretoken')[0].value;
+	options.headers = Object.assign({'X-CSRFToken': csrfToken}, options.headers || {});
+	return fetch(url, options).then(response => response.json().then(data => ({status: response.status, data: data})));
+}
+
+async function uploadFile(form, file) {
+	var response = await uploadRequest(form.dataset.uploadUrl, {
+		method: 'POST',
+		headers: {'Content-Type': 'application/json'},
+		body: JSON.stringify({filename: file.name, size: file.size})
+	});
+	var upload = response.data;
+	if (response.status !== 201) {
+		throw new Error(upload.error);
+	}
+
+	var retries = 0;
+	while (!upload.complete) {
+		try {
+			response = await uploadRequest(upload.url, {
+				method: 'PUT',
+				headers: {'Upload-Offset': upload.offset, 'Content-Type': 'application/octet-stream'},
+				body: file.slice(upload.offset, upload.offset + UPLOAD_CHUNK_SIZE)
+			});
+			// A 409 carries the offset the server has, so carry on from there
+			if (response.status !== 200 && response.status !== 409) {
+				throw new Error(response.data.error);
+			}
+			upload = response.data;
+		} catch (error) {
+			// Ask the server how far it got and resume, backing off a little each time
+			if (++retries > 5) {
+				throw error;
+			}
+			await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+			upload = (await uploadRequest(upload.url, {method: 'GET'})).data;
+		}
+	}
+	return upload.id;
+}
+
+document.querySelectorAll('form.chunked-upload').forEach(form => {
+	form.addEventListener('submit', async event => {
+		var files = form.querySelector('input[type=file]').files;
+		if (!window.fetch || !files.length) {
+			return;
+		}
+		event.preventDefault();
+
+		var uploads = [];
+		for (const file of files) {
+			uploads.push(await uploadFile(form, file));
+		}
+		await uploadRequest(form.dataset.attachUrl, {
+			method: 'POST',
+			headers: {'Content-Type': 'application/json'},
+			body: JSON.stringify({uploads: uploads})
+		});
+		window.location.reload();
+	});
+});
+
+
 // TICKET MENU
 const allMenu = document.querySelectorAll('main .ticket-detail .menu');
 
@@ -2,10 +2,11 @@ from django.contrib import admin
 
 # Register your models here.
 
-from .models import Category, Ticket, Message, TicketHistory, Attachment
+from .models import Category, Ticket, Message, TicketHistory, Attachment, TicketCounter
 
 admin.site.register(Category)
 admin.site.register(Ticket)
 admin.site.register(Message)
 admin.site.register(TicketHistory)
-admin.site.register(Attachment)
\ No newline at end of file
+admin.site.register(Attachment)
+admin.site.register(TicketCounter)
\ No newline at end of file
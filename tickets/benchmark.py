@@ -0,0 +1,379 @@
+"""
+Seeding and timing for the benchmark commands.
+
+seed_benchmark_data fills the database with bulk_create, which skips the signals
+that keep counters, search documents and profiles in step, so seed() rebuilds
+those afterwards. run_benchmarks then requests every page through the test
+client and reports latency percentiles and query counts per page.
+compare_sessions counts the queries each session backend adds to a request.
+run_concurrent_writes forks several processes that create tickets and messages
+at the same time, as gunicorn workers would, and counts lock errors.
+"""
+
+import contextlib
+import math
+import multiprocessing
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import OperationalError, connections, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from notifications.cache import invalidate as invalidate_notifications
+from notifications.models import Notification
+from projects.models import Project
+from users.models import CustomUser, Profile
+
+from .counters import rebuild_counters
+from .importer import batched
+from .models import Category, Message, Ticket
+from .search import rebuild_index
+
+# Every seeded account shares this password so the runner can sign in as any of them
+PASSWORD = 'benchmark'
+
+USERNAME_PREFIX = 'bench'
+
+CATEGORIES = ['Backend', 'Frontend', 'Infrastructure', 'Design', 'Support']
+
+WORDS = ('deploy login page error timeout database export report slow crash email invoice search '
+         'upload dashboard chart permission cache button mobile release').split()
+
+
+def sentence(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def fanout(rng, distribution, maximum):
+    # Number of assignees for one ticket
+    if distribution == 'none' or maximum == 0:
+        return 0
+    if distribution == 'uniform':
+        return rng.randint(0, maximum)
+    # skewed: most tickets have one or two assignees, a long tail has many
+    return min(int(rng.paretovariate(1.5)), maximum)
+
+
+def seed(users=1000, projects=50, tickets=10000, messages=100000, notifications=20000,
+         assignee_distribution='skewed', max_assignees=5, batch_size=5000, random_seed=0, log=None):
+    rng = random.Random(random_seed)
+    log = log or (lambda message: None)
+    counts = {}
+
+    with transaction.atomic():
+        offset = CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        password = make_password(PASSWORD)
+        account_types = [choice for choice, label in CustomUser.ACCOUNT_TYPE_CHOICES]
+        new_users = (
+            CustomUser(username=f'{USERNAME_PREFIX}{offset + i}', email=f'{USERNAME_PREFIX}{offset + i}@example.com',
+                       password=password, account_type=rng.choice(account_types))
+            for i in range(users)
+        )
+        for batch in batched(new_users, batch_size):
+            CustomUser.objects.bulk_create(batch)
+        # bulk_create skips the post_save that gives every user a profile
+        Profile.objects.bulk_create(
+            [Profile(user_id=user_id, account_type=account_type)
+             for user_id, account_type in CustomUser.objects.filter(profile__isnull=True)
+             .values_list('id', 'account_type')],
+            batch_size=batch_size)
+        user_ids = list(CustomUser.objects.values_list('id', flat=True))
+        counts['users'] = users
+        log(f'{users} users')
+
+        Project.objects.bulk_create([
+            Project(name=f'Project {i}', description=sentence(rng), user_id=rng.choice(user_ids))
+            for i in range(projects)
+        ])
+        project_ids = list(Project.objects.values_list('id', flat=True))
+        for name in CATEGORIES:
+            Category.objects.get_or_create(name=name)
+        category_ids = list(Category.objects.values_list('id', flat=True))
+        counts['projects'] = projects
+        log(f'{projects} projects')
+
+        first_ticket = (Ticket.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        new_tickets = (
+            Ticket(project_id=rng.choice(project_ids), host_id=rng.choice(user_ids),
+                   category_id=rng.choice(category_ids), name=sentence(rng, 5),
+                   description=f'<p>{sentence(rng, 40)}</p>', status=rng.random() < 0.6,
+                   priority=rng.choice(Ticket.PRIORITIES)[0], type=rng.choice(Ticket.TYPE)[0])
+            for _ in range(tickets)
+        )
+        for batch in batched(new_tickets, batch_size):
+            Ticket.objects.bulk_create(batch)
+        ticket_ids = list(Ticket.objects.filter(id__gte=first_ticket).values_list('id', flat=True))
+        counts['tickets'] = tickets
+        log(f'{tickets} tickets')
+
+        Assignee = Ticket.assignee.through
+        assignments = (
+            Assignee(ticket_id=ticket_id, customuser_id=user_id)
+            for ticket_id in ticket_ids
+            for user_id in rng.sample(user_ids, min(fanout(rng, assignee_distribution, max_assignees), len(user_ids)))
+        )
+        counts['assignments'] = 0
+        for batch in batched(assignments, batch_size):
+            Assignee.objects.bulk_create(batch)
+            counts['assignments'] += len(batch)
+        log(f"{counts['assignments']} assignments ({assignee_distribution})")
+
+        new_messages = (
+            Message(ticket_id=rng.choice(ticket_ids), user_id=rng.choice(user_ids), body=sentence(rng, 12))
+            for _ in range(messages)
+        )
+        for batch in batched(new_messages, batch_size):
+            Message.objects.bulk_create(batch)
+        counts['messages'] = messages
+        log(f'{messages} messages')
+
+        new_notifications = (
+            Notification(recipient_id=rng.choice(user_ids), ticket_id=rng.choice(ticket_ids),
+                         message='A ticket you are assigned to was updated', notification_type='updated',
+                         is_read=rng.random() < 0.7)
+            for _ in range(notifications)
+        )
+        for batch in batched(new_notifications, batch_size):
+            Notification.objects.bulk_create(batch)
+        counts['notifications'] = notifications
+        log(f'{notifications} notifications')
+
+    # What the skipped signals would have maintained
+    rebuild_counters()
+    counts['search_documents'] = rebuild_index(batch_size=batch_size)
+    cache.clear()
+    log(f"rebuilt counters and {counts['search_documents']} search documents")
+    return counts
+
+
+# Timing
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of an unsorted list
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def busiest(queryset, field, count):
+    # Ids of the objects with the most related rows, where a page has the most to render
+    return list(queryset.order_by(f'-{field}', 'id').values_list('id', flat=True)[:count])
+
+
+def benchmark_pages(samples=5):
+    # (name, [urls]); pages that take an id are measured on the busiest few rows
+    ticket_ids = busiest(Ticket.objects.annotate(message_count=Count('message')), 'message_count', samples)
+    project_ids = busiest(Project.objects.annotate(ticket_count=Count('project')), 'ticket_count', samples)
+    return [
+        ('home', [reverse('home')]),
+        ('ticket_home', [reverse('ticket-home')]),
+        ('ticket_home_search', [reverse('ticket-home') + '?search=database+error']),
+        ('ticket', [reverse('ticket', args=[pk]) for pk in ticket_ids]),
+        ('ticket_search', [reverse('ticket', args=[pk]) + '?q=timeout' for pk in ticket_ids]),
+        ('project_home', [reverse('project-home')]),
+        ('project', [reverse('project', args=[pk]) for pk in project_ids]),
+        ('manage_users', [reverse('manage-users')]),
+        ('profile', [reverse('profile')]),
+        ('stats_data', [reverse('stats-data')]),
+        ('ticket_data', [reverse('ticket-data')]),
+        ('type_data', [reverse('type-data')]),
+        ('status_data', [reverse('status-data')]),
+        ('notifications', [reverse('view_notifications')]),
+    ]
+
+
+def benchmark_user():
+    # A seeded admin with unread notifications, so every page has something to render
+    users = CustomUser.objects.filter(username__startswith=USERNAME_PREFIX, account_type='admin')
+    user = users.filter(notifications__is_read=False).order_by('id').first() or users.order_by('id').first()
+    if user is None:
+        raise CustomUser.DoesNotExist('No benchmark users; run seed_benchmark_data first')
+    return user
+
+
+def unread_restorer(user):
+    # view_notifications marks everything read, so without this only its first request would have a list to render
+    unread = list(user.notifications.filter(is_read=False).values_list('id', flat=True))
+
+    def restore():
+        Notification.objects.filter(id__in=unread).update(is_read=False)
+        invalidate_notifications(user.pk)
+    return restore
+
+
+def time_page(client, urls, iterations, warmup, cold, reset=None):
+    # reset runs before every request, outside the timing, to undo what the previous one changed
+    timings, queries, statuses = [], [], set()
+    for i in range(warmup + iterations):
+        url = urls[i % len(urls)]
+        if reset:
+            reset()
+        if cold:
+            cache.clear()
+        with contextlib.ExitStack() as stack:
+            # Every alias, so reads sent to the 'read' connection are counted too
+            contexts = [stack.enter_context(CaptureQueriesContext(db)) for db in connections.all()]
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - start
+        if i < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        queries.append(sum(len(context.captured_queries) for context in contexts))
+        statuses.add(response.status_code)
+    if reset:
+        reset()
+    return {
+        'url': urls[0],
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'median_queries': statistics.median_low(queries),
+        'max_queries': max(queries),
+        'status': sorted(statuses),
+    }
+
+
+def run(iterations=20, warmup=2, cold=False, only=None, log=None):
+    log = log or (lambda message: None)
+    user = benchmark_user()
+    client = Client()
+    client.force_login(user)
+    resets = {'notifications': unread_restorer(user)}
+
+    results = {}
+    for name, urls in benchmark_pages():
+        if not urls or (only and name not in only):
+            continue
+        results[name] = time_page(client, urls, iterations, warmup, cold, reset=resets.get(name))
+        result = results[name]
+        log(f"{name:<20} p50 {result['p50_ms']:>8.1f} ms   p95 {result['p95_ms']:>8.1f} ms   "
+            f"queries {result['max_queries']:>4}")
+    return results
+
+
+def regressions(results, baseline, tolerance=0.2, noise_ms=5.0):
+    # Pages slower than the baseline p95 by more than tolerance (ignoring a few ms of jitter) or running more queries
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        limit = before['p95_ms'] * (1 + tolerance) + noise_ms
+        if result['p95_ms'] > limit:
+            found.append(f"{name}: p95 {result['p95_ms']} ms, baseline {before['p95_ms']} ms")
+        if result['max_queries'] > before['max_queries']:
+            found.append(f"{name}: {result['max_queries']} queries, baseline {before['max_queries']}")
+    return found
+
+
+# Session backends
+
+SESSION_PAGES = ('home', 'ticket_home', 'profile', 'notifications')
+
+
+def count_queries(client, url):
+    # (all queries, queries on the session table) for one request
+    with contextlib.ExitStack() as stack:
+        contexts = [stack.enter_context(CaptureQueriesContext(db)) for db in connections.all()]
+        client.get(url)
+    queries = [query['sql'] for context in contexts for query in context.captured_queries]
+    return len(queries), sum('django_session' in sql for sql in queries)
+
+
+def compare_sessions(engines, iterations=20, log=None):
+    # Mean queries per request, and how many of them touch the session table, for each SESSION_ENGINE
+    log = log or (lambda message: None)
+    user = benchmark_user()
+    urls = [pages[0] for name, pages in benchmark_pages(samples=1) if name in SESSION_PAGES and pages]
+    results = {}
+    for name, engine in engines.items():
+        with override_settings(SESSION_ENGINE=engine):
+            client = Client()
+            client.force_login(user)
+            # The first request fills the session cache, as it would for a returning user
+            client.get(urls[0])
+            counts = [count_queries(client, urls[i % len(urls)]) for i in range(iterations)]
+        results[name] = {
+            'queries_per_request': round(statistics.fmean(total for total, session in counts), 2),
+            'session_queries_per_request': round(statistics.fmean(session for total, session in counts), 2),
+        }
+        log(f"{name:<16} {results[name]['queries_per_request']:>6.2f} queries per request, "
+            f"{results[name]['session_queries_per_request']:.2f} on the session table")
+    return results
+
+
+# Concurrent writes
+
+CONCURRENCY_PROJECT = 'Concurrency benchmark'
+
+
+def write_tickets(project_id, user_ids, writes, messages, worker=0):
+    # One worker's share: tickets with an assignee and messages, saved one by one so every signal runs
+    rng = random.Random(worker)
+    timings, errors = [], []
+    for _ in range(writes):
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                ticket = Ticket.objects.create(project_id=project_id, host_id=rng.choice(user_ids),
+                                               name=sentence(rng, 5), description=f'<p>{sentence(rng, 20)}</p>')
+                ticket.assignee.add(rng.choice(user_ids))
+            for _ in range(messages):
+                Message.objects.create(ticket=ticket, user_id=rng.choice(user_ids), body=sentence(rng, 12))
+        except OperationalError as error:
+            errors.append(str(error))
+        else:
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings, errors
+
+
+def _write_worker(args):
+    # Runs in a forked process; its connection opens on first use
+    connections.close_all()
+    try:
+        return write_tickets(*args)
+    finally:
+        connections.close_all()
+
+
+def run_concurrent_writes(workers=4, writes=50, messages=2, keep=False):
+    user_ids = list(CustomUser.objects.order_by('id').values_list('id', flat=True)[:50])
+    if not user_ids:
+        raise CustomUser.DoesNotExist('No users to write as; run seed_benchmark_data first')
+    project = Project.objects.create(name=CONCURRENCY_PROJECT, description='Written by run_concurrency_benchmark')
+
+    # Forked children must not share the parent's open connection
+    connections.close_all()
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        results = pool.map(_write_worker, [(project.id, user_ids, writes, messages, worker)
+                                           for worker in range(workers)])
+    elapsed = time.perf_counter() - start
+
+    timings = [timing for worker_timings, worker_errors in results for timing in worker_timings]
+    errors = [error for worker_timings, worker_errors in results for error in worker_errors]
+    tickets = Ticket.objects.filter(project=project).count()
+    report = {
+        'workers': workers,
+        'tickets': tickets,
+        'messages': Message.objects.filter(ticket__project=project).count(),
+        'errors': len(errors),
+        'locked_errors': sum('locked' in error or 'busy' in error for error in errors),
+        'tickets_per_second': round(tickets / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.5), 2) if timings else None,
+        'p95_ms': round(percentile(timings, 0.95), 2) if timings else None,
+        'error_samples': sorted(set(errors))[:5],
+    }
+    if not keep:
+        # Signals take the counters and search documents down with the tickets
+        for ticket in Ticket.objects.filter(project=project):
+            ticket.delete()
+        project.delete()
+    return report
@@ -0,0 +1,48 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.safestring import mark_safe
+
+from .models import Ticket
+
+# Fragments can't go stale, since any change bumps the version in the key and Ticket.save()
+# never writes the column back; the timeout only covers names rendered from other tables
+# (users, categories) and frees memory
+FRAGMENT_TIMEOUT = 600
+
+
+def bump_version(*ticket_ids):
+    Ticket.objects.filter(id__in=ticket_ids).update(version=F('version') + 1)
+
+
+def fragment_key(ticket, name, variant=''):
+    digest = md5(variant.encode()).hexdigest() if variant else ''
+    return f'tickets:fragment:{ticket.id}:{ticket.version}:{name}:{digest}'
+
+
+def query_variant(request):
+    # Page cursors and the search query, in a stable order
+    return urlencode(sorted(request.GET.lists()), doseq=True)
+
+
+def ticket_fragments(request, ticket, builders, vary_on_query=(), vary_on=None):
+    # {name: html}; every fragment is looked up in one round trip and only the missing ones are built.
+    # vary_on maps a fragment to any other string its html depends on
+    variant = query_variant(request)
+    vary_on = vary_on or {}
+    keys = {name: fragment_key(ticket, name, (variant if name in vary_on_query else '') + vary_on.get(name, ''))
+            for name in builders}
+    cached = cache.get_many(keys.values())
+
+    fragments = {}
+    missing = {}
+    for name, key in keys.items():
+        if key in cached:
+            fragments[name] = mark_safe(cached[key])
+        else:
+            fragments[name] = missing[key] = builders[name](request, ticket)
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+    return fragments
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Ticket, TicketCounter
+
+BUCKET_FIELDS = ('project_id', 'status', 'priority', 'type')
+
+
+def ticket_bucket_from(values):
+    # Views assign raw POST strings to the fields, so normalise them the way the database stores them
+    return {
+        'project_id': values['project_id'],
+        'status': Ticket._meta.get_field('status').to_python(values['status']),
+        'priority': values['priority'],
+        'type': values['type'],
+    }
+
+
+def ticket_bucket(ticket):
+    return ticket_bucket_from({field: getattr(ticket, field) for field in BUCKET_FIELDS})
+
+
+def adjust_counter(bucket, delta):
+    if bucket['project_id'] is None or delta == 0:
+        return
+    
+    with transaction.atomic():
+        updated = TicketCounter.objects.filter(**bucket).update(count=F('count') + delta)
+        
+        # Only increments create a bucket; a decrement of a missing bucket (e.g. during a
+        # project cascade delete) is left to rebuild_ticket_counters to reconcile
+        if not updated and delta > 0:
+            counter, created = TicketCounter.objects.get_or_create(defaults={'count': delta}, **bucket)
+            if not created:
+                TicketCounter.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+
+def actual_counts():
+    # Scan the ticket table, only used when rebuilding or checking the counters
+    rows = (Ticket.objects.order_by()
+            .values(*BUCKET_FIELDS)
+            .annotate(count=Count('id')))
+    return {tuple(row[field] for field in BUCKET_FIELDS): row['count'] for row in rows}
+
+
+def stored_counts():
+    rows = TicketCounter.objects.filter(count__gt=0).values(*BUCKET_FIELDS, 'count')
+    return {tuple(row[field] for field in BUCKET_FIELDS): row['count'] for row in rows}
+
+
+def counter_drift():
+    # Buckets whose stored count differs from the ticket table, as {bucket: (stored, actual)}
+    actual = actual_counts()
+    stored = stored_counts()
+    drift = {}
+    for bucket in set(actual) | set(stored):
+        if actual.get(bucket, 0) != stored.get(bucket, 0):
+            drift[bucket] = (stored.get(bucket, 0), actual.get(bucket, 0))
+    return drift
+
+
+@transaction.atomic
+def rebuild_counters():
+    TicketCounter.objects.all().delete()
+    counters = [
+        TicketCounter(count=count, **dict(zip(BUCKET_FIELDS, bucket)))
+        for bucket, count in actual_counts().items()
+    ]
+    TicketCounter.objects.bulk_create(counters)
+    return len(counters)
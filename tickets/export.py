@@ -0,0 +1,176 @@
+"""
+Streaming exports of tickets and their activity as CSV or JSONL.
+
+Tickets are read with QuerySet.iterator(chunk_size), so their assignees,
+messages and history are prefetched one chunk at a time: memory stays bounded
+by the chunk size however many tickets match, and the header row goes out
+before the first query has finished.
+"""
+
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from users.models import CustomUser
+
+from .history import TRACKED_FIELDS, snapshot, walk
+from .models import Message, Ticket, TicketHistory
+from .search import strip_html
+from .stats import filter_tickets
+
+DATASETS = ('tickets', 'activity')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Tickets fetched (with their activity) per query
+CHUNK_SIZE = 500
+
+# Lines are sent in parts of roughly this many characters rather than one at a time
+BUFFER_SIZE = 64 * 1024
+
+COLUMNS = {
+    'tickets': ['id', 'project', 'name', 'status', 'priority', 'type', 'category', 'host', 'assignees',
+                'created', 'updated', 'message_count', 'history_count', 'description'],
+    'activity': ['ticket_id', 'kind', 'id', 'created', 'user', 'body', 'changes'],
+}
+
+
+def export_tickets(params, tickets=None):
+    # Project, assignee and date range filters as on the dashboard, plus status=open|closed.
+    # Raises ValueError for parameters that are not valid.
+    tickets = filter_tickets(Ticket.objects.all() if tickets is None else tickets, params)
+    status = params.get('status')
+    if status:
+        if status not in ('open', 'closed'):
+            raise ValueError('status must be open or closed')
+        tickets = tickets.filter(status=status == 'open')
+    return tickets
+
+
+def with_activity(tickets):
+    users = CustomUser.objects.only('id', 'username')
+    messages = Message.objects.select_related('user').only('id', 'ticket_id', 'body', 'created', 'user__username')
+    history = TicketHistory.objects.select_related('updated_by').order_by('-id')
+    return (tickets.select_related('project', 'category', 'host')
+            .prefetch_related(Prefetch('assignee', queryset=users),
+                              Prefetch('message_set', queryset=messages.order_by('created', 'id')),
+                              Prefetch('history', queryset=history))
+            .order_by('id'))
+
+
+def iter_tickets(tickets, chunk_size=CHUNK_SIZE):
+    # The prefetches above run once per chunk of tickets
+    return with_activity(tickets).iterator(chunk_size=chunk_size)
+
+
+def history_changes(ticket):
+    # [(history, {field: [before, after]})], oldest first, from the prefetched diff rows
+    entries = []
+    newer = snapshot(ticket)
+    for history, older in walk(ticket, ticket.history.all()):
+        changed = {}
+        for field in TRACKED_FIELDS:
+            if older[field] != newer[field]:
+                if field == 'description':
+                    changed[field] = [strip_html(older[field]), strip_html(newer[field])]
+                else:
+                    changed[field] = [older[field], newer[field]]
+        entries.append((history, changed))
+        newer = older
+    return entries[::-1]
+
+
+def activity_records(ticket):
+    records = [{
+        'ticket_id': ticket.id,
+        'kind': 'message',
+        'id': message.id,
+        'created': message.created.isoformat(),
+        'user': message.user.username,
+        'body': message.body,
+        'changes': None,
+    } for message in ticket.message_set.all()]
+    records += [{
+        'ticket_id': ticket.id,
+        'kind': 'history',
+        'id': history.id,
+        'created': history.created.isoformat(),
+        'user': history.updated_by.username if history.updated_by else None,
+        'body': '',
+        'changes': changes,
+    } for history, changes in history_changes(ticket)]
+    return sorted(records, key=lambda record: record['created'])
+
+
+def ticket_record(ticket, nested=False):
+    activity = activity_records(ticket)
+    record = {
+        'id': ticket.id,
+        'project': ticket.project.name,
+        'name': ticket.name,
+        'status': 'open' if ticket.status else 'closed',
+        'priority': ticket.priority,
+        'type': ticket.type,
+        'category': ticket.category.name if ticket.category else None,
+        'host': ticket.host.username if ticket.host else None,
+        'assignees': [user.username for user in ticket.assignee.all()],
+        'created': ticket.created.isoformat(),
+        'updated': ticket.updated.isoformat(),
+        'message_count': sum(1 for entry in activity if entry['kind'] == 'message'),
+        'history_count': sum(1 for entry in activity if entry['kind'] == 'history'),
+        'description': strip_html(ticket.description),
+    }
+    if nested:
+        record['activity'] = activity
+    return record
+
+
+def records(dataset, tickets, nested=False, chunk_size=CHUNK_SIZE):
+    for ticket in iter_tickets(tickets, chunk_size):
+        if dataset == 'tickets':
+            yield ticket_record(ticket, nested)
+        else:
+            yield from activity_records(ticket)
+
+
+class Echo:
+    # csv.writer target that hands each formatted row back instead of storing it
+    def write(self, value):
+        return value
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ';'.join(value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+def export_lines(dataset, file_format, tickets, chunk_size=CHUNK_SIZE):
+    # Yields the export as text, the CSV header on its own so the download starts at once
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        columns = COLUMNS[dataset]
+        yield writer.writerow(columns)
+        lines = (writer.writerow([csv_value(record[column]) for column in columns])
+                 for record in records(dataset, tickets, chunk_size=chunk_size))
+    else:
+        lines = (json.dumps(record) + '\n' for record in records(dataset, tickets, nested=True, chunk_size=chunk_size))
+
+    # The first record also goes out alone, later ones in parts of BUFFER_SIZE
+    buffer, size, sent = [], 0, False
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE or not sent:
+            yield ''.join(buffer)
+            buffer, size, sent = [], 0, True
+    if buffer:
+        yield ''.join(buffer)
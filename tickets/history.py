@@ -0,0 +1,162 @@
+import json
+import re
+from difflib import SequenceMatcher
+
+from django.db import transaction
+
+from .models import Ticket, TicketHistory
+
+# Fields whose previous values are kept in TicketHistory.changes
+TRACKED_FIELDS = ['name', 'status', 'priority', 'type', 'description']
+
+# Words, runs of whitespace and HTML tags; diffing on these keeps deltas small and readable
+TOKEN_RE = re.compile(r'(\s+|<[^>]*>)')
+
+
+def tokens(text):
+    return [token for token in TOKEN_RE.split(text) if token]
+
+
+def text_delta(source, target):
+    # Ops that turn source into target: n copies n characters, -n skips n, a string is inserted
+    a, b = tokens(source), tokens(target)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append(len(''.join(a[i1:i2])))
+            continue
+        if i2 > i1:
+            ops.append(-len(''.join(a[i1:i2])))
+        if j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(source, ops):
+    output = []
+    position = 0
+    for op in ops:
+        if isinstance(op, str):
+            output.append(op)
+        elif op >= 0:
+            output.append(source[position:position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(output)
+
+
+def snapshot(ticket):
+    # Views assign raw POST strings to status, so normalise it like ticket_document does
+    state = {field: getattr(ticket, field) for field in TRACKED_FIELDS}
+    state['status'] = Ticket._meta.get_field('status').to_python(state['status'])
+    state['description'] = state['description'] or ''
+    return state
+
+
+def reverse_changes(older, newer):
+    # What a history row stores: enough to get from the newer state back to the older one
+    changes = {}
+    for field in TRACKED_FIELDS:
+        if older[field] == newer[field]:
+            continue
+        if field == 'description':
+            delta = text_delta(newer[field], older[field])
+            # Keep the plain text when the delta would not be any smaller
+            changes[field] = delta if len(json.dumps(delta)) < len(json.dumps(older[field])) else older[field]
+        else:
+            changes[field] = older[field]
+    return changes
+
+
+def apply_changes(state, changes):
+    older = dict(state)
+    for field, change in changes.items():
+        if field == 'description' and isinstance(change, list):
+            older[field] = apply_delta(state[field], change)
+        else:
+            older[field] = change
+    return older
+
+
+def legacy_state(history):
+    # Rows written before diffs were introduced hold a full copy of the previous ticket
+    return {
+        'name': history.name,
+        'status': history.status,
+        'priority': history.priority,
+        'type': history.type,
+        'description': history.description or '',
+    }
+
+
+def record_change(ticket, before, user):
+    # Called after the ticket is updated; skips the row entirely when nothing tracked changed
+    changes = reverse_changes(before, snapshot(ticket))
+    if not changes:
+        return None
+    return TicketHistory.objects.create(ticket=ticket, updated_by=user, changes=changes)
+
+
+def revisions(ticket, since_id=None):
+    # Yield (history id, state before that edit), newest first, by walking back from the current ticket
+    rows = ticket.history.order_by('-id')
+    if since_id is not None:
+        rows = rows.filter(id__gte=since_id)
+    rows = rows.only('id', 'changes', 'name', 'status', 'priority', 'type', 'description')
+
+    for history, state in walk(ticket, rows.iterator()):
+        yield history.id, state
+
+
+def walk(ticket, rows):
+    # Pair already loaded history rows, newest first, with the state before each edit
+    state = snapshot(ticket)
+    for history in rows:
+        if history.changes is None:
+            state = legacy_state(history)
+        else:
+            state = apply_changes(state, history.changes)
+        yield history, state
+
+
+def state_at(ticket, history):
+    # The ticket as it was just before the edit recorded by history
+    for history_id, state in revisions(ticket, since_id=history.id):
+        if history_id == history.id:
+            return state
+    raise TicketHistory.DoesNotExist
+
+
+def attach_revisions(ticket, histories):
+    # Give each history row on a page its reconstructed state, with one query for the whole page
+    histories = list(histories)
+    if not histories:
+        return
+    states = dict(revisions(ticket, since_id=min(history.id for history in histories)))
+    for history in histories:
+        history.revision = states[history.id]
+
+
+@transaction.atomic
+def compact_ticket(ticket):
+    # Rewrite legacy snapshot rows as diffs against the next newer state; rows that changed nothing are removed
+    converted = removed = 0
+    newer = snapshot(ticket)
+    for history in ticket.history.order_by('-id').select_for_update():
+        if history.changes is not None:
+            newer = apply_changes(newer, history.changes)
+            continue
+
+        older = legacy_state(history)
+        changes = reverse_changes(older, newer)
+        if changes:
+            history.changes = changes
+            history.name = history.status = history.priority = history.type = history.description = None
+            history.save(update_fields=['changes', 'name', 'status', 'priority', 'type', 'description'])
+            converted += 1
+        else:
+            history.delete()
+            removed += 1
+        newer = older
+    return converted, removed
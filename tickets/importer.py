@@ -0,0 +1,335 @@
+"""
+Bulk import of projects, users, tickets, assignees and messages from CSV or JSONL.
+
+Rows are streamed and inserted with bulk_create, one transaction per batch, so no
+per-row signals fire. Foreign keys are resolved through in-memory maps: users by
+username, projects and tickets by the id they had in the source system (only
+within one import run). Importer.finish() then does in bulk what the signals
+would have done row by row: profiles, participants, ticket counters, search
+documents, page cache versions and, optionally, 'created' notifications.
+"""
+
+import csv
+import datetime
+import json
+import os
+import sys
+from collections import Counter, deque
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from notifications.models import NotificationEvent
+from projects.models import Project
+from users.models import CustomUser, Profile
+
+from . import search
+from .cache import bump_version
+from .counters import adjust_counter
+from .models import Category, Message, Ticket
+
+# Order the entities are imported in; later ones refer to earlier ones
+KINDS = ['projects', 'users', 'tickets', 'assignees', 'messages']
+
+# Problems reported per import before the rest are only counted
+MAX_ERRORS = 100
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'open'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n', 'closed'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def batched(objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_rows(path, file_format=None):
+    # Yield dicts from a .csv or .jsonl file ('-' reads stdin), one line at a time
+    if file_format is None:
+        file_format = 'csv' if path.endswith('.csv') else 'jsonl'
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if file_format == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def text(row, field, default=''):
+    value = row.get(field)
+    return default if value is None else str(value).strip()
+
+
+def parse_bool(value, default=True):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in TRUE_VALUES:
+        return True
+    if str(value).strip().lower() in FALSE_VALUES:
+        return False
+    raise RowError(f'{value!r} is not a status')
+
+
+def parse_choice(value, choices, default):
+    if value in (None, ''):
+        return default
+    for choice, label in choices:
+        if str(value).strip().lower() in (choice.lower(), label.lower()):
+            return choice
+    raise RowError(f'{value!r} is not one of {", ".join(choice for choice, label in choices)}')
+
+
+def parse_timestamp(value):
+    if value in (None, ''):
+        return None
+    parsed = parse_datetime(str(value).strip())
+    if parsed is None:
+        raise RowError(f'{value!r} is not a date and time')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+def restore_timestamps(model, objects, stamps):
+    # One prepared UPDATE run for every row; bulk_update's CASE expression is far slower at this size
+    rows = []
+    for obj, (created, updated) in zip(objects, stamps):
+        if created or updated:
+            obj.created = created or obj.created
+            obj.updated = updated or created or obj.updated
+            rows.append((obj.created, obj.updated, obj.pk))
+    if not rows:
+        return
+    adapt = connection.ops.adapt_datetimefield_value
+    sql = f'UPDATE {connection.ops.quote_name(model._meta.db_table)} SET created = %s, updated = %s WHERE id = %s'
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(adapt(created), adapt(updated), pk) for created, updated, pk in rows])
+
+
+class Importer:
+    def __init__(self, batch_size=2000, log=None):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Without ids back from bulk_create there is no way to map source ids to new rows
+            raise NotImplementedError(f'Bulk import is not supported on {connection.vendor}')
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.users = dict(CustomUser.objects.values_list('username', 'id'))
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.projects = {}
+        self.tickets = {}
+        self.new_users = []
+        self.new_tickets = []
+        self.new_messages = []
+        self.touched_tickets = set()
+        self.buckets = Counter()
+        self.counts = Counter()
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, kind, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'{kind} row {line}: {message}')
+
+    def build(self, kind, rows, make):
+        # Turn rows into unsaved objects, skipping (and reporting) the ones that cannot be resolved
+        for line, row in enumerate(rows, 1):
+            try:
+                yield make(row)
+            except (RowError, KeyError) as error:
+                self.error(kind, line, error)
+            except (TypeError, ValueError) as error:
+                self.error(kind, line, f'invalid value ({error})')
+
+    def lookup(self, mapping, key, label):
+        try:
+            return mapping[key]
+        except KeyError:
+            raise RowError(f'unknown {label} {key!r}') from None
+
+    def user(self, row, field, required=True):
+        username = text(row, field)
+        if not username and not required:
+            return None
+        return self.lookup(self.users, username, 'user')
+
+    def save(self, kind, model, objects, timestamps=False):
+        # bulk_create in batches, each in its own transaction; yields each saved batch
+        for batch in batched(objects, self.batch_size):
+            if timestamps:
+                # auto_now fields overwrite whatever bulk_create is given, so put the source's back afterwards
+                stamps = [(obj.created, obj.updated) for obj in batch]
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+                if timestamps:
+                    restore_timestamps(model, batch, stamps)
+            self.counts[kind] += len(batch)
+            yield batch
+        self.log(f'{self.counts[kind]} {kind}')
+
+    def import_projects(self, rows):
+        pending = deque()
+
+        def make(row):
+            project = Project(name=text(row, 'name')[:30], description=text(row, 'description')[:200],
+                              user_id=self.user(row, 'owner', required=False))
+            if not project.name:
+                raise RowError('name is required')
+            pending.append(text(row, 'id'))
+            return project
+
+        for batch in self.save('projects', Project, self.build('projects', rows, make)):
+            for project in batch:
+                self.projects[pending.popleft()] = project.id
+
+    def import_users(self, rows):
+        unusable = make_password(None)
+        account_types = CustomUser.ACCOUNT_TYPE_CHOICES
+
+        def make(row):
+            username = text(row, 'username')
+            if not username:
+                raise RowError('username is required')
+            if username in self.users:
+                raise RowError(f'user {username!r} already exists')
+            # Only ready-made Django hashes are accepted; hashing each password here would take hours
+            user = CustomUser(username=username, email=text(row, 'email'), first_name=text(row, 'first_name'),
+                              last_name=text(row, 'last_name'), password=text(row, 'password_hash') or unusable,
+                              account_type=parse_choice(row.get('account_type'), account_types, 'developer'))
+            # Placeholder so later rows in this file see the name as taken
+            self.users[username] = None
+            return user
+
+        for batch in self.save('users', CustomUser, self.build('users', rows, make)):
+            for user in batch:
+                self.users[user.username] = user.id
+                self.new_users.append((user.id, user.account_type))
+
+    def category(self, name):
+        if not name:
+            return None
+        if name not in self.categories:
+            self.categories[name] = Category.objects.create(name=name).id
+        return self.categories[name]
+
+    def import_tickets(self, rows):
+        pending = deque()
+
+        def make(row):
+            ticket = Ticket(
+                project_id=self.lookup(self.projects, text(row, 'project'), 'project'),
+                host_id=self.user(row, 'host', required=False),
+                category_id=self.category(text(row, 'category')),
+                name=text(row, 'name')[:200],
+                description=text(row, 'description') or None,
+                status=parse_bool(row.get('status')),
+                priority=parse_choice(row.get('priority'), Ticket.PRIORITIES, 'None'),
+                type=parse_choice(row.get('type'), Ticket.TYPE, 'Misc'),
+                created=parse_timestamp(row.get('created')),
+                updated=parse_timestamp(row.get('updated')),
+            )
+            if not ticket.name:
+                raise RowError('name is required')
+            pending.append(text(row, 'id'))
+            return ticket
+
+        for batch in self.save('tickets', Ticket, self.build('tickets', rows, make), timestamps=True):
+            for ticket in batch:
+                self.tickets[pending.popleft()] = ticket.id
+                self.new_tickets.append(ticket.id)
+                self.buckets[(ticket.project_id, ticket.status, ticket.priority, ticket.type)] += 1
+
+    def import_assignees(self, rows):
+        Assignee = Ticket.assignee.through
+
+        def make(row):
+            return Assignee(ticket_id=self.lookup(self.tickets, text(row, 'ticket'), 'ticket'),
+                            customuser_id=self.user(row, 'user'))
+
+        for batch in batched(self.build('assignees', rows, make), self.batch_size):
+            with transaction.atomic():
+                Assignee.objects.bulk_create(batch, ignore_conflicts=True)
+            self.counts['assignees'] += len(batch)
+            self.touched_tickets.update(assignee.ticket_id for assignee in batch)
+        self.log(f"{self.counts['assignees']} assignees")
+
+    def import_messages(self, rows):
+        Participant = Ticket.participants.through
+
+        def make(row):
+            message = Message(ticket_id=self.lookup(self.tickets, text(row, 'ticket'), 'ticket'),
+                              user_id=self.user(row, 'user'), body=text(row, 'body'),
+                              created=parse_timestamp(row.get('created')),
+                              updated=parse_timestamp(row.get('updated')))
+            if not message.body:
+                raise RowError('body is required')
+            return message
+
+        for batch in self.save('messages', Message, self.build('messages', rows, make), timestamps=True):
+            # Commenting on a ticket makes the author a participant, as in the ticket view
+            pairs = {(message.ticket_id, message.user_id) for message in batch}
+            Participant.objects.bulk_create(
+                [Participant(ticket_id=ticket_id, customuser_id=user_id) for ticket_id, user_id in pairs],
+                ignore_conflicts=True)
+            self.new_messages.extend(message.id for message in batch)
+            self.touched_tickets.update(message.ticket_id for message in batch)
+
+    def import_kind(self, kind, rows):
+        getattr(self, f'import_{kind}')(rows)
+
+    def finish(self, notify=False):
+        # The post_save work skipped by bulk_create, done once per import instead of once per row
+        Profile.objects.bulk_create([Profile(user_id=user_id, account_type=account_type)
+                                     for user_id, account_type in self.new_users], batch_size=self.batch_size)
+
+        for (project_id, status, priority, type), count in self.buckets.items():
+            adjust_counter({'project_id': project_id, 'status': status, 'priority': priority, 'type': type}, count)
+
+        # Tickets are indexed after their assignees, whose usernames are part of the document
+        indexed = search.index_new('ticket', self.new_tickets, self.batch_size)
+        indexed += search.index_new('message', self.new_messages, self.batch_size)
+        self.log(f'{indexed} search documents')
+
+        # Pages cached while the import was running are stale now
+        touched = sorted(self.touched_tickets)
+        for start in range(0, len(touched), self.batch_size):
+            bump_version(*touched[start:start + self.batch_size])
+
+        if notify:
+            # Queued on the outbox, so the notification worker fans them out in batches
+            NotificationEvent.objects.bulk_create(
+                [NotificationEvent(ticket_id=ticket_id, event_type='created') for ticket_id in self.new_tickets],
+                batch_size=self.batch_size)
+        return self.counts
+
+
+def import_files(files, batch_size=2000, notify=False, file_format=None, log=None):
+    # files: {kind: path}; imported in KINDS order so references resolve
+    for path in files.values():
+        if path and path != '-' and not os.path.exists(path):
+            raise FileNotFoundError(path)
+    importer = Importer(batch_size=batch_size, log=log)
+    for kind in KINDS:
+        if files.get(kind):
+            importer.import_kind(kind, read_rows(files[kind], file_format))
+    importer.finish(notify=notify)
+    return importer
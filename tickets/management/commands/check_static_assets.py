@@ -0,0 +1,65 @@
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.utils import get_app_template_dirs
+
+STATIC_TAG_RE = re.compile(r"""{%\s*static\s+(?P<quote>['"]?)(?P<name>[^'"\s%]+)(?P=quote)""")
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+
+
+def template_dirs():
+    dirs = [str(path) for engine in settings.TEMPLATES for path in engine.get('DIRS', [])]
+    return dirs + [str(path) for path in get_app_template_dirs('templates')]
+
+
+def template_files(dirs):
+    for directory in dirs:
+        for root, subdirs, files in os.walk(directory):
+            for filename in sorted(files):
+                if filename.endswith(TEMPLATE_EXTENSIONS):
+                    yield os.path.join(root, filename)
+
+
+class Command(BaseCommand):
+    help = ('Fail if a template refers to a static asset that collectstatic has not hashed, '
+            'or hard-codes a STATIC_URL path that bypasses the manifest')
+
+    def add_arguments(self, parser):
+        parser.add_argument('dirs', nargs='*', help='Template directories to scan (default: every configured one)')
+
+    def handle(self, *args, **options):
+        hashed = getattr(staticfiles_storage, 'hashed_files', None)
+        if not hashed:
+            raise CommandError('No static files manifest; run collectstatic first')
+
+        hard_coded = None
+        if settings.STATIC_URL.startswith('/'):
+            hard_coded = re.compile(r"""(?:src|href)\s*=\s*['"]%s""" % re.escape(settings.STATIC_URL))
+
+        problems, references = [], 0
+        for path in template_files(options['dirs'] or template_dirs()):
+            with open(path, encoding='utf-8') as template:
+                source = template.read()
+            for match in STATIC_TAG_RE.finditer(source):
+                line = source.count('\n', 0, match.start()) + 1
+                if not match.group('quote'):
+                    # A variable; its value is only known when the page renders
+                    continue
+                references += 1
+                name = match.group('name')
+                if staticfiles_storage.hash_key(staticfiles_storage.clean_name(name)) not in hashed:
+                    problems.append(f'{path}:{line}: {name} is not in the manifest')
+            if hard_coded:
+                for match in hard_coded.finditer(source):
+                    line = source.count('\n', 0, match.start()) + 1
+                    problems.append(f'{path}:{line}: hard-coded {settings.STATIC_URL} path, use {{% static %}}')
+
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'{len(problems)} unhashed static reference(s)')
+        self.stdout.write(self.style.SUCCESS(f'{references} static references, all hashed'))
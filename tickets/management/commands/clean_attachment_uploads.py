@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tickets.models import UploadSession
+from tickets.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that were abandoned or never attached to a ticket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24,
+                            help='Remove uploads that have not been touched for this many hours')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        sessions = UploadSession.objects.filter(updated__lt=cutoff)
+        removed = 0
+        for session in sessions.iterator():
+            discard_upload(session)
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} stale upload(s)'))
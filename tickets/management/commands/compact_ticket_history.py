@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from tickets.history import compact_ticket
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = 'Rewrite full-copy ticket history rows as field-level diffs and drop rows that changed nothing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ticket', type=int, action='append', dest='tickets',
+                            help='Only compact this ticket id (may be repeated)')
+
+    def handle(self, *args, **options):
+        tickets = Ticket.objects.filter(history__changes__isnull=True).distinct().order_by('id')
+        if options['tickets']:
+            tickets = tickets.filter(id__in=options['tickets'])
+
+        converted = removed = 0
+        # Each ticket is compacted in its own transaction, so the command can be stopped and rerun
+        for ticket in Ticket.objects.filter(id__in=list(tickets.values_list('id', flat=True))).order_by('id'):
+            ticket_converted, ticket_removed = compact_ticket(ticket)
+            converted += ticket_converted
+            removed += ticket_removed
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Converted {converted} history row(s) to diffs and removed {removed} unchanged row(s)'))
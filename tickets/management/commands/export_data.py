@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.export import CHUNK_SIZE, DATASETS, export_lines, export_tickets
+
+
+class Command(BaseCommand):
+    help = 'Export tickets, or their messages and history, as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=DATASETS)
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--project', type=int)
+        parser.add_argument('--assignee', type=int)
+        parser.add_argument('--status', choices=['open', 'closed'])
+        parser.add_argument('--start', help='Only tickets created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Only tickets created on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        params = {name: options[name] for name in ('project', 'assignee', 'status', 'start', 'end') if options[name]}
+        try:
+            tickets = export_tickets(params)
+        except ValueError as error:
+            raise CommandError(error)
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for part in export_lines(options['dataset'], options['format'], tickets, options['chunk_size']):
+                output.write(part)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.importer import KINDS, import_files
+
+
+class Command(BaseCommand):
+    help = 'Bulk import projects, users, tickets, assignees and messages from CSV or JSONL files'
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(f'--{kind}', metavar='FILE', help=f'{kind.capitalize()} to import (.csv or .jsonl, - for stdin)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format, when the extension does not say')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--notify', action='store_true',
+                            help='Queue a "created" notification for every imported ticket')
+        parser.add_argument('--strict', action='store_true', help='Exit with an error if any row was skipped')
+
+    def handle(self, *args, **options):
+        files = {kind: options[kind] for kind in KINDS if options[kind]}
+        if not files:
+            raise CommandError(f"Nothing to import; pass at least one of {', '.join('--' + kind for kind in KINDS)}")
+
+        try:
+            importer = import_files(files, batch_size=options['batch_size'], notify=options['notify'],
+                                    file_format=options['format'], log=self.stdout.write)
+        except (FileNotFoundError, NotImplementedError) as error:
+            raise CommandError(error)
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        if importer.error_count > len(importer.errors):
+            self.stderr.write(f'... and {importer.error_count - len(importer.errors)} more')
+
+        summary = ', '.join(f'{importer.counts[kind]} {kind}' for kind in KINDS if kind in files)
+        if importer.error_count:
+            message = f'Imported {summary}; skipped {importer.error_count} row(s)'
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Imported {summary}'))
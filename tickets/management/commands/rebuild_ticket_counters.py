@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.counters import counter_drift, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized ticket counters from the ticket table, or check them for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report buckets that have drifted; exit with an error if any have')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = counter_drift()
+            for (project_id, status, priority, type), (stored, actual) in sorted(drift.items(), key=str):
+                self.stdout.write(f'project={project_id} status={status} priority={priority} type={type}: '
+                                  f'stored {stored}, actual {actual}')
+            if drift:
+                raise CommandError(f'{len(drift)} ticket counter bucket(s) have drifted')
+            self.stdout.write(self.style.SUCCESS('Ticket counters are in sync'))
+            return
+
+        buckets = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} ticket counter bucket(s)'))
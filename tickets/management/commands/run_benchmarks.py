@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.benchmark import regressions, run
+
+
+class Command(BaseCommand):
+    help = 'Time every page against the current database and compare with a saved baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--only', action='append', help='Only time this page (may be repeated)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Fail if a page is slower or runs more queries than in this JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown against the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        results = run(iterations=options['iterations'], warmup=options['warmup'], cold=options['cold'],
+                      only=options['only'], log=self.stdout.write)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                found = regressions(results, json.load(baseline), tolerance=options['tolerance'])
+            for line in found:
+                self.stderr.write(line)
+            if found:
+                raise CommandError(f'{len(found)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tickets.benchmark import run_concurrent_writes
+
+
+class Command(BaseCommand):
+    help = 'Create tickets and messages from several processes at once and fail on any database lock error'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Processes writing at the same time')
+        parser.add_argument('--writes', type=int, default=50, help='Tickets created by each process')
+        parser.add_argument('--messages', type=int, default=2, help='Messages added to each ticket')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark project and its tickets')
+        parser.add_argument('--output', help='Write the report to this JSON file')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            journal_mode = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+            self.stdout.write(f'SQLite journal mode: {journal_mode}')
+        report = run_concurrent_writes(workers=options['workers'], writes=options['writes'],
+                                       messages=options['messages'], keep=options['keep'])
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+        if report['errors']:
+            raise CommandError(f"{report['errors']} write(s) failed, {report['locked_errors']} on a database lock")
+        self.stdout.write(self.style.SUCCESS(f"{report['tickets']} tickets written by {report['workers']} workers "
+                                             f"without lock errors"))
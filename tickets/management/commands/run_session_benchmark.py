@@ -0,0 +1,25 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tickets.benchmark import compare_sessions
+
+
+class Command(BaseCommand):
+    help = 'Compare the database queries per request under each session backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--backend', action='append', choices=sorted(settings.SESSION_BACKENDS),
+                            help='Only measure this backend (may be repeated)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        names = options['backend'] or list(settings.SESSION_BACKENDS)
+        results = compare_sessions({name: settings.SESSION_BACKENDS[name] for name in names},
+                                   iterations=options['iterations'], log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from tickets.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with generated users, projects, tickets, messages and notifications for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--projects', type=int, default=50)
+        parser.add_argument('--tickets', type=int, default=10000)
+        parser.add_argument('--messages', type=int, default=100000)
+        parser.add_argument('--notifications', type=int, default=20000)
+        parser.add_argument('--assignees', choices=['none', 'uniform', 'skewed'], default='skewed',
+                            help='How assignees are spread over tickets; skewed gives a few tickets many assignees')
+        parser.add_argument('--max-assignees', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable datasets')
+
+    def handle(self, *args, **options):
+        counts = seed(
+            users=options['users'],
+            projects=options['projects'],
+            tickets=options['tickets'],
+            messages=options['messages'],
+            notifications=options['notifications'],
+            assignee_distribution=options['assignees'],
+            max_assignees=options['max_assignees'],
+            batch_size=options['batch_size'],
+            random_seed=options['seed'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['tickets']} ticket(s) and {counts['messages']} message(s)"))
@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import RequestFactory
+
+from mable.warmup import project_templates, reset_template_cache
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ("Compile and render each of the project's templates and report the time each takes, "
+            "cold (as in a new worker) and warm (from the cached loader)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Warm renders timed per template')
+        parser.add_argument('--user', help='Render as this user (default: anonymous)')
+        parser.add_argument('names', nargs='*', help='Only these templates (default: all under templates/)')
+
+    def handle(self, *args, **options):
+        engine = engines['django']
+        request = RequestFactory().get('/')
+        request.user = CustomUser.objects.get(username=options['user']) if options['user'] else AnonymousUser()
+
+        self.stdout.write(f"{'template':<40} {'compile ms':>10} {'first render ms':>16} {'render ms':>10}")
+        total = 0.0
+        for name in options['names'] or list(project_templates()):
+            # Start every template from an empty cache, so its parents and includes count as cold too
+            reset_template_cache()
+            start = time.perf_counter()
+            template = engine.get_template(name)
+            compile_ms = (time.perf_counter() - start) * 1000
+            total += compile_ms
+
+            try:
+                renders = []
+                for _ in range(options['iterations'] + 1):
+                    start = time.perf_counter()
+                    template.render({}, request)
+                    renders.append((time.perf_counter() - start) * 1000)
+            except Exception as error:
+                # Most pages need view context; an empty one is enough for the timings of the rest
+                self.stdout.write(f'{name:<40} {compile_ms:>10.2f} {"":>16} {"":>10}  '
+                                  f'render failed: {type(error).__name__}')
+                continue
+            self.stdout.write(f'{name:<40} {compile_ms:>10.2f} {renders[0]:>16.2f} '
+                              f'{statistics.median(renders[1:]):>10.2f}')
+
+        reset_template_cache()
+        self.stdout.write(f'Compiling every template took {total:.1f} ms')
@@ -0,0 +1,41 @@
+# Generated by Django 4.1.5 on 2026-10-18 14:04
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketCounter = apps.get_model('tickets', 'TicketCounter')
+    rows = (Ticket.objects.order_by()
+            .values('project_id', 'status', 'priority', 'type')
+            .annotate(count=Count('id')))
+    TicketCounter.objects.bulk_create([TicketCounter(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_initial'),
+        ('tickets', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.BooleanField(choices=[(True, 'Open'), (False, 'Closed')], default=True)),
+                ('priority', models.TextField(choices=[('None', 'None'), ('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], default='None', max_length=10)),
+                ('type', models.TextField(choices=[('Misc', 'Misc'), ('Bug', 'Bug'), ('Help Needed', 'Help Needed'), ('Concern', 'Concern'), ('Question', 'Question')], default='Misc', max_length=15)),
+                ('count', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_counters', to='projects.project')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ticketcounter',
+            constraint=models.UniqueConstraint(fields=('project', 'status', 'priority', 'type'), name='unique_ticket_counter_bucket'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
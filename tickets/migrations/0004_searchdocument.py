@@ -0,0 +1,71 @@
+# Generated by Django 4.1.5 on 2026-10-18 14:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE tickets_searchdocument_fts USING fts5("
+    "body, content='tickets_searchdocument', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER tickets_searchdocument_ai AFTER INSERT ON tickets_searchdocument BEGIN "
+    "INSERT INTO tickets_searchdocument_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER tickets_searchdocument_ad AFTER DELETE ON tickets_searchdocument BEGIN "
+    "INSERT INTO tickets_searchdocument_fts(tickets_searchdocument_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER tickets_searchdocument_au AFTER UPDATE ON tickets_searchdocument BEGIN "
+    "INSERT INTO tickets_searchdocument_fts(tickets_searchdocument_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+    "INSERT INTO tickets_searchdocument_fts(rowid, body) VALUES (new.id, new.body); END",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS tickets_searchdocument_ai",
+    "DROP TRIGGER IF EXISTS tickets_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS tickets_searchdocument_au",
+    "DROP TABLE IF EXISTS tickets_searchdocument_fts",
+]
+
+POSTGRESQL_INDEX = [
+    "CREATE INDEX tickets_searchdocument_body_gin ON tickets_searchdocument "
+    "USING GIN (to_tsvector('simple', body))",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS tickets_searchdocument_body_gin",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 table on SQLite, GIN expression index on PostgreSQL, nothing elsewhere
+    statements = {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRESQL_INDEX}
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_ticketcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ticket', 'Ticket'), ('message', 'Message'), ('history', 'History')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('body', models.TextField(blank=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='tickets.ticket')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.5 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tickethistory',
+            name='changes',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='tickethistory',
+            name='name',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='tickethistory',
+            name='priority',
+            field=models.TextField(choices=[('None', 'None'), ('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], default='None', max_length=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='tickethistory',
+            name='status',
+            field=models.BooleanField(choices=[(True, 'Open'), (False, 'Closed')], default=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='tickethistory',
+            name='type',
+            field=models.TextField(choices=[('Misc', 'Misc'), ('Bug', 'Bug'), ('Help Needed', 'Help Needed'), ('Concern', 'Concern'), ('Question', 'Question')], default='Misc', max_length=15, null=True),
+        ),
+    ]
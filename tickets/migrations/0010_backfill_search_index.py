@@ -0,0 +1,78 @@
+from html import unescape
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+BATCH_SIZE = 1000
+
+
+# The document builders as of this migration; tickets/search.py has the live ones
+
+def strip_html(text):
+    return ' '.join(unescape(strip_tags(text or '')).split())
+
+
+def joined(parts):
+    return ' '.join(part for part in parts if part)
+
+
+def ticket_document(ticket):
+    status = ticket._meta.get_field('status').to_python(ticket.status)
+    return joined([
+        ticket.name,
+        strip_html(ticket.description),
+        ticket.category.name if ticket.category else '',
+        ticket.host.username if ticket.host else '',
+        ' '.join(user.username for user in ticket.assignee.all()),
+        dict(ticket._meta.get_field('status').choices).get(status, ''),
+        ticket.priority,
+        ticket.type,
+    ])
+
+
+def message_document(message):
+    return joined([message.body, message.user.username])
+
+
+def history_document(history):
+    name, description = history.name, history.description
+    if history.changes is not None:
+        name = history.changes.get('name')
+        description = history.changes.get('description') or ''
+        if isinstance(description, list):
+            description = ' '.join(op for op in description if isinstance(op, str))
+    return joined([name, strip_html(description), history.updated_by.username if history.updated_by else ''])
+
+
+def backfill_search_index(apps, schema_editor):
+    # 0004 created an empty index; fill it for the rows written before then, as rebuild_search_index does
+    SearchDocument = apps.get_model('tickets', 'SearchDocument')
+    sources = {
+        'ticket': (apps.get_model('tickets', 'Ticket').objects.select_related('category', 'host')
+                   .prefetch_related('assignee'), lambda ticket: (ticket.id, ticket_document(ticket))),
+        'message': (apps.get_model('tickets', 'Message').objects.select_related('user'),
+                    lambda message: (message.ticket_id, message_document(message))),
+        'history': (apps.get_model('tickets', 'TicketHistory').objects.select_related('updated_by'),
+                    lambda history: (history.ticket_id, history_document(history))),
+    }
+    SearchDocument.objects.all().delete()
+    for kind, (queryset, build) in sources.items():
+        documents = []
+        for obj in queryset.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            ticket_id, body = build(obj)
+            documents.append(SearchDocument(kind=kind, object_id=obj.pk, ticket_id=ticket_id, body=body))
+            if len(documents) >= BATCH_SIZE:
+                SearchDocument.objects.bulk_create(documents)
+                documents = []
+        SearchDocument.objects.bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_uploadsession_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from users.models import CustomUser, Profile
 from ckeditor.fields import RichTextField
 from projects.models import Project
 
+from .permissions import permissions_for
+
 # Create your models here.
 
 class Category(models.Model):
@@ -13,6 +17,30 @@ class Category(models.Model):
     
     
     
+class TicketQuerySet(models.QuerySet):
+    # Columns the ticket tables render; the description HTML is left out
+    LISTING_FIELDS = (
+        'id', 'name', 'status', 'priority', 'type', 'updated', 'created',
+        'host__id', 'host__username',
+        'category__id', 'category__name',
+        'project__id', 'project__name',
+    )
+    
+    def for_listing(self):
+        # Host, category, project and assignees (with their profile pictures) in a fixed number of queries
+        assignees = (CustomUser.objects.select_related('profile')
+                     .only('id', 'username', 'email', 'account_type', 'profile__id', 'profile__profile_pic',
+                           'profile__avatar_source', 'profile__avatars'))
+        return (self.select_related('host', 'category', 'project')
+                .prefetch_related(models.Prefetch('assignee', queryset=assignees))
+                .only(*self.LISTING_FIELDS))
+    
+    def visible_to(self, user, action='view_ticket'):
+        # The tickets the user may take the action on, filtered in SQL; rules are in tickets/permissions.py
+        return permissions_for(user).filter(self, action)
+
+
+
 class Ticket(models.Model):
     STATUS = (
         (True, 'Open'),
@@ -45,24 +73,61 @@ class Ticket(models.Model):
     description = RichTextField(null=True, blank=True)
     # description = models.TextField(null=True, blank=True)
     participants = models.ManyToManyField(CustomUser, related_name='participants', blank=True)
+    # Bumped whenever the ticket or its messages, history or attachments change; keys the cached page fragments
+    version = models.PositiveIntegerField(default=0, editable=False)
     updated = models.DateTimeField(auto_now=True)
     created = models.DateTimeField(auto_now_add=True)
     
+    objects = TicketQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-updated', '-created']
+        indexes = [
+            # Project pages list a project's tickets newest first
+            models.Index(fields=['project', '-updated'], name='ticket_project_updated_idx'),
+            # Dashboard and stats breakdowns by status and priority
+            models.Index(fields=['status', 'priority'], name='ticket_status_priority_idx'),
+        ]
         
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ticket = super().from_db(db, field_names, values)
+        # The stored values, so save signals can tell what changed without reading the row again
+        ticket._loaded_values = dict(zip(field_names, values))
+        return ticket
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # The row may have changed since it was loaded; the next save reads it again
+        self.__dict__.pop('_loaded_values', None)
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            # version only moves forward in SQL (tickets/cache.py bump_version); writing back the
+            # value this instance loaded would undo bumps made since and reuse a cached fragment key
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'version'
+                                       and field.attname not in deferred]
+        # The counter, search and outbox rows written by post_save commit or roll back with the ticket
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 
 class TicketHistory(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='history')
     updated_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True)
-    name = models.CharField(max_length=200)
-    status = models.BooleanField(choices=Ticket.STATUS, default=True)
-    priority = models.TextField(choices=Ticket.PRIORITIES, default='None', max_length=10)
-    type = models.TextField(choices=Ticket.TYPE, default='Misc', max_length=15)
+    # Previous values of the fields this edit changed, see tickets/history.py.
+    # Null on rows from before diffs, which still carry a full copy in the columns below
+    changes = models.JSONField(null=True, blank=True)
+    name = models.CharField(max_length=200, null=True, blank=True)
+    status = models.BooleanField(choices=Ticket.STATUS, default=True, null=True)
+    priority = models.TextField(choices=Ticket.PRIORITIES, default='None', max_length=10, null=True)
+    type = models.TextField(choices=Ticket.TYPE, default='Misc', max_length=15, null=True)
     description = RichTextField(null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
 
@@ -71,7 +136,36 @@ class TicketHistory(models.Model):
 class Attachment(models.Model):
     file = models.FileField(upload_to='attachments')
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='attachments')
+    # Uploaded files are stored once per SHA-256 digest, see tickets/uploads.py
+    filename = models.CharField(max_length=255, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def display_name(self):
+        return self.filename or self.file.name
+
+
+class UploadSession(models.Model):
+    # A chunked upload in progress; the bytes received so far live in a .part file under ATTACHMENT_UPLOAD_DIR
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='upload_sessions')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    # Set while a request writes the chunk at received; see tickets/uploads.py write_chunk
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # Set once every byte has arrived and the blob is in storage
+    sha256 = models.CharField(max_length=64, blank=True)
+    blob = models.CharField(max_length=255, blank=True)
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def complete(self):
+        return bool(self.blob)
     
     
 
@@ -86,6 +180,50 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['-updated', '-created']
+        indexes = [
+            # The messages tab pages through one ticket's messages newest first
+            models.Index(fields=['ticket', '-updated'], name='message_ticket_updated_idx'),
+        ]
+    
+    def __str__(self):
+        return self.body[0:50]
+
+
+class TicketCounter(models.Model):
+    # Ticket totals per project x status x priority x type, kept in sync by tickets/signals.py
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='ticket_counters')
+    status = models.BooleanField(choices=Ticket.STATUS, default=True)
+    priority = models.TextField(choices=Ticket.PRIORITIES, default='None', max_length=10)
+    type = models.TextField(choices=Ticket.TYPE, default='Misc', max_length=15)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'status', 'priority', 'type'], name='unique_ticket_counter_bucket'),
+        ]
+    
+    def __str__(self):
+        return f'{self.project_id}/{self.get_status_display()}/{self.priority}/{self.type}: {self.count}'
+
+
+
+class SearchDocument(models.Model):
+    # Plain-text copy of a ticket, message or history entry, indexed by the backend in tickets/search.py
+    KINDS = (
+        ('ticket', 'Ticket'),
+        ('message', 'Message'),
+        ('history', 'History'),
+    )
+    
+    kind = models.CharField(choices=KINDS, max_length=10)
+    object_id = models.BigIntegerField()
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='search_documents')
+    body = models.TextField(blank=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+        
     def __str__(self):
-        return self.body[0:50]
\ No newline at end of file
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,169 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def encode_value(value):
+    # Full microsecond precision, the keyset compares these for equality
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[-1], forward=True)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[0], forward=False)
+        return None
+
+    @property
+    def estimated_total(self):
+        return self.paginator.estimated_total
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over the queryset's ordering (the model's Meta.ordering if the
+    queryset has none), with the primary key appended as a tie-breaker. Every page is a
+    single indexed range query, so deep pages cost the same as the first one and no
+    COUNT(*) is ever run.
+
+    With estimate=True, estimated_total is the PostgreSQL planner's row estimate, which
+    costs an EXPLAIN rather than a scan; other databases have no such estimate and give
+    None, which the templates leave out.
+    """
+
+    def __init__(self, queryset, per_page, estimate=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.estimate = estimate
+        self.ordering = self.get_ordering(queryset)
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        fields = []
+        for field in ordering:
+            if not isinstance(field, str):
+                raise TypeError('CursorPaginator only supports ordering by field or annotation names')
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            fields.append(('pk' if name == queryset.model._meta.pk.name else name, descending))
+
+        if not any(name == 'pk' for name, descending in fields):
+            # Follow the direction of the leading field so the tie-breaker reads naturally
+            fields.append(('pk', fields[0][1] if fields else True))
+        return fields
+
+    def order_by(self, forward):
+        return [('-' if descending == forward else '') + name for name, descending in self.ordering]
+
+    def values_for(self, obj):
+        return [obj.pk if name == 'pk' else getattr(obj, name) for name, descending in self.ordering]
+
+    def encode_cursor(self, obj, forward):
+        payload = json.dumps({'d': 'n' if forward else 'p', 'v': self.values_for(obj)}, default=encode_value)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        # Anything that is not a cursor we issued falls back to the first page
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = payload['v']
+            forward = payload['d'] == 'n'
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            return None
+
+        converted = []
+        for (name, descending), value in zip(self.ordering, values):
+            try:
+                field = self.queryset.model._meta.pk if name == 'pk' else self.queryset.model._meta.get_field(name)
+                value = field.to_python(value)
+            except FieldDoesNotExist:
+                pass
+            except Exception:
+                return None
+            converted.append(value)
+        return converted, forward
+
+    def keyset_filter(self, values, forward):
+        # (a, b, pk) after the cursor: a past it, or a equal and b past it, or ...
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending == forward else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            for (previous, _), value in zip(self.ordering[:index], values):
+                clause &= Q(**{previous: value})
+            condition |= clause
+        return condition
+
+    def get_page(self, cursor):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            values, forward = None, True
+        else:
+            values, forward = decoded
+
+        queryset = self.queryset.order_by(*self.order_by(forward))
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, forward))
+
+        # One extra row tells us whether there is another page in this direction
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            return CursorPage(rows, self, has_next=has_more, has_previous=values is not None)
+        rows.reverse()
+        return CursorPage(rows, self, has_next=True, has_previous=has_more)
+
+    @cached_property
+    def estimated_total(self):
+        if not self.estimate:
+            return None
+
+        connection = connections[self.queryset.db]
+        if connection.vendor == 'postgresql':
+            # The planner's row estimate, without running the COUNT(*)
+            sql, params = self.queryset.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        return None
@@ -0,0 +1,107 @@
+"""
+Who may do what to tickets and messages, in one place.
+
+Each action is granted by a user's relation to the object (host, message author,
+assignee, owner of the ticket's project) or outright by their role. filter()
+turns the rules into a WHERE clause, so list views and single-object lookups
+never load rows the user may not touch.
+
+Every relation is evaluated inside that query (a column, a join to the project or
+a subquery), so a change of assignee or project owner applies at once. The role is read from
+the user row the request already loaded, so a role change applies from the next
+request.
+
+can() answers for a single object and remembers the answer for the rest of the
+request; permissions_for() keeps one Permissions per user object, so the memo
+never outlives the request. An assignee, host, project owner or role change
+forgets every memo in the process (see invalidate()), so a request that makes
+one sees it in its later checks.
+"""
+
+from django.db.models import Q
+
+# Relations that grant each action
+RULES = {
+    'view_ticket': {'anyone'},
+    'change_ticket': {'host', 'project_owner'},
+    'delete_ticket': {'host', 'project_owner'},
+    # The tickets on a user's own list
+    'involved_ticket': {'host', 'assignee'},
+    'delete_message': {'author'},
+}
+
+# Actions a role may take on every object, whatever its relation to it
+ROLE_GRANTS = {
+    'admin': {'view_ticket', 'change_ticket', 'delete_ticket', 'delete_message'},
+}
+
+# Bumped by the signals whenever a rule's inputs change; a memo from an older generation is dropped
+generation = 0
+
+
+def invalidate():
+    global generation
+    generation += 1
+
+
+class Permissions:
+    def __init__(self, user):
+        self.user = user
+        self.memo = {}
+        self.generation = generation
+
+    def has_role(self, *roles):
+        return self.user.is_authenticated and self.user.account_type in roles
+
+    def granted_by_role(self, action):
+        return action in ROLE_GRANTS.get(self.user.account_type, ())
+
+    def relation_q(self, relation, queryset):
+        if relation == 'host':
+            return Q(host_id=self.user.id)
+        if relation == 'author':
+            return Q(user_id=self.user.id)
+        if relation == 'project_owner':
+            return Q(project__user_id=self.user.id)
+        if relation == 'assignee':
+            # A subquery on the assignee table's user index; joining it instead would repeat tickets
+            assigned = queryset.model.assignee.through.objects.filter(customuser_id=self.user.id)
+            return Q(id__in=assigned.values('ticket_id'))
+        raise ValueError(f'Unknown relation {relation!r}')
+
+    def filter(self, queryset, action):
+        # The rows of queryset the user may take the action on, in the same query
+        if not self.user.is_authenticated:
+            return queryset.none()
+        relations = RULES[action]
+        if 'anyone' in relations or self.granted_by_role(action):
+            return queryset
+        condition = Q()
+        for relation in sorted(relations):
+            condition |= self.relation_q(relation, queryset)
+        return queryset.filter(condition)
+
+    def can(self, action, obj):
+        # Whether the user may take the action on obj, one query per object and set of rules
+        if not self.user.is_authenticated:
+            return False
+        relations = RULES[action]
+        if 'anyone' in relations or self.granted_by_role(action):
+            return True
+        if self.generation != generation:
+            self.memo.clear()
+            self.generation = generation
+        # Actions with the same rules share an answer
+        key = (obj._meta.label, obj.pk, tuple(sorted(relations)))
+        if key not in self.memo:
+            self.memo[key] = self.filter(type(obj)._default_manager.filter(pk=obj.pk), action).exists()
+        return self.memo[key]
+
+
+def permissions_for(user):
+    # One per user object, and so per request
+    try:
+        return user._ticket_permissions
+    except AttributeError:
+        user._ticket_permissions = Permissions(user)
+        return user._ticket_permissions
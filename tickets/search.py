@@ -0,0 +1,239 @@
+import re
+from html import unescape
+
+from django.db import connection, transaction
+from django.db.models import Case, When, IntegerField
+from django.utils.html import strip_tags
+
+from .models import Ticket, Message, TicketHistory, SearchDocument
+
+# Upper bound on ranked ids pulled from the index for a single search, applied after scoping
+RESULT_LIMIT = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def strip_html(text):
+    # CKEditor stores HTML, index only the visible text
+    return ' '.join(unescape(strip_tags(text or '')).split())
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query or '')[:16]
+
+
+def scope_sql(scope):
+    # The caller's rows as a subquery, so the index only ranks documents the caller can list
+    return scope.order_by().values('pk').query.sql_with_params()
+
+
+class SqliteSearchBackend:
+    def search(self, query, kind, ticket_id=None, limit=RESULT_LIMIT, scope=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # Every token must match, each as a prefix; quoting keeps FTS5 syntax out of user input
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        sql = ('SELECT d.object_id FROM tickets_searchdocument_fts f '
+               'JOIN tickets_searchdocument d ON d.id = f.rowid '
+               'WHERE tickets_searchdocument_fts MATCH %s AND d.kind = %s')
+        params = [match, kind]
+        if ticket_id is not None:
+            sql += ' AND d.ticket_id = %s'
+            params.append(ticket_id)
+        if scope is not None:
+            scope_query, scope_params = scope_sql(scope)
+            sql += f' AND d.object_id IN ({scope_query})'
+            params += scope_params
+        sql += ' ORDER BY bm25(tickets_searchdocument_fts) LIMIT %s'
+        params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    def search(self, query, kind, ticket_id=None, limit=RESULT_LIMIT, scope=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # The expression must match the GIN index created in migration 0004
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        sql = ("SELECT object_id FROM tickets_searchdocument "
+               "WHERE kind = %s AND to_tsvector('simple', body) @@ to_tsquery('simple', %s)")
+        params = [kind, tsquery]
+        if ticket_id is not None:
+            sql += ' AND ticket_id = %s'
+            params.append(ticket_id)
+        if scope is not None:
+            scope_query, scope_params = scope_sql(scope)
+            sql += f' AND object_id IN ({scope_query})'
+            params += scope_params
+        sql += " ORDER BY ts_rank(to_tsvector('simple', body), to_tsquery('simple', %s)) DESC LIMIT %s"
+        params += [tsquery, limit]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    # Unindexed scan over the plain-text documents for databases without a full-text backend
+    def search(self, query, kind, ticket_id=None, limit=RESULT_LIMIT, scope=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        documents = SearchDocument.objects.filter(kind=kind)
+        if ticket_id is not None:
+            documents = documents.filter(ticket_id=ticket_id)
+        if scope is not None:
+            documents = documents.filter(object_id__in=scope.order_by().values('pk'))
+        for token in tokens:
+            documents = documents.filter(body__icontains=token)
+        return list(documents.order_by('-object_id').values_list('object_id', flat=True)[:limit])
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend():
+    # Picked from the engine in settings.DATABASES
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def ranked(queryset, ids):
+    # Restrict the queryset to the search hits, best match first
+    if not ids:
+        return queryset.none()
+    # Annotated rather than ordered by the expression so CursorPaginator can page on it
+    rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+                output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+def search_tickets(tickets, query):
+    return ranked(tickets, get_backend().search(query, 'ticket', scope=tickets))
+
+
+def search_messages(messages, query, ticket=None):
+    ticket_id = ticket.id if ticket else None
+    return ranked(messages, get_backend().search(query, 'message', ticket_id, scope=messages))
+
+
+def search_history(history, query, ticket=None):
+    ticket_id = ticket.id if ticket else None
+    return ranked(history, get_backend().search(query, 'history', ticket_id, scope=history))
+
+
+# Building and storing the indexed documents
+
+def ticket_document(ticket):
+    # Views assign raw POST strings to status, so normalise it before looking up the label
+    status = Ticket._meta.get_field('status').to_python(ticket.status)
+    parts = [
+        ticket.name,
+        strip_html(ticket.description),
+        ticket.category.name if ticket.category else '',
+        ticket.host.username if ticket.host else '',
+        ' '.join(user.username for user in ticket.assignee.all()),
+        dict(Ticket.STATUS).get(status, ''),
+        ticket.priority,
+        ticket.type,
+    ]
+    return ' '.join(part for part in parts if part)
+
+
+def message_document(message):
+    return ' '.join(part for part in [message.body, message.user.username] if part)
+
+
+def history_document(history):
+    name, description = history.name, history.description
+    if history.changes is not None:
+        # Diff rows: index the old name and the description text the edit replaced
+        name = history.changes.get('name')
+        description = history.changes.get('description') or ''
+        if isinstance(description, list):
+            description = ' '.join(op for op in description if isinstance(op, str))
+    parts = [
+        name,
+        strip_html(description),
+        history.updated_by.username if history.updated_by else '',
+    ]
+    return ' '.join(part for part in parts if part)
+
+
+def store(kind, object_id, ticket_id, body):
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=object_id,
+        defaults={'ticket_id': ticket_id, 'body': body},
+    )
+
+
+def remove(kind, object_id):
+    SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def index_ticket(ticket):
+    store('ticket', ticket.id, ticket.id, ticket_document(ticket))
+
+
+def index_message(message):
+    store('message', message.id, message.ticket_id, message_document(message))
+
+
+def index_history(history):
+    store('history', history.id, history.ticket_id, history_document(history))
+
+
+def document_sources():
+    # kind: (queryset, obj -> (ticket id, document body))
+    return {
+        'ticket': (Ticket.objects.select_related('category', 'host').prefetch_related('assignee'),
+                   lambda ticket: (ticket.id, ticket_document(ticket))),
+        'message': (Message.objects.select_related('user'),
+                    lambda message: (message.ticket_id, message_document(message))),
+        'history': (TicketHistory.objects.select_related('updated_by'),
+                    lambda history: (history.ticket_id, history_document(history))),
+    }
+
+
+def write_documents(kind, queryset, build, batch_size):
+    total = 0
+    documents = []
+    for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+        ticket_id, body = build(obj)
+        documents.append(SearchDocument(kind=kind, object_id=obj.pk, ticket_id=ticket_id, body=body))
+        if len(documents) >= batch_size:
+            SearchDocument.objects.bulk_create(documents)
+            total += len(documents)
+            documents = []
+    SearchDocument.objects.bulk_create(documents)
+    return total + len(documents)
+
+
+@transaction.atomic
+def rebuild_index(batch_size=1000):
+    # Recreate every document from scratch; used by the rebuild_search_index command
+    SearchDocument.objects.all().delete()
+    total = 0
+    for kind, (queryset, build) in document_sources().items():
+        total += write_documents(kind, queryset, build, batch_size)
+    return total
+
+
+def index_new(kind, ids, batch_size=1000):
+    # Documents for objects created without signals (bulk imports); they must not be indexed yet
+    queryset, build = document_sources()[kind]
+    total = 0
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            total += write_documents(kind, queryset.filter(pk__in=ids[start:start + batch_size]), build, batch_size)
+    return total
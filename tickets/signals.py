@@ -0,0 +1,131 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from projects.models import Project
+from users.models import CustomUser
+
+from .models import Ticket, Message, TicketHistory, Attachment
+from .cache import bump_version
+from . import permissions
+from .counters import BUCKET_FIELDS, ticket_bucket, ticket_bucket_from, adjust_counter
+from . import search
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_ticket_bucket(sender, instance, **kwargs):
+    # Remember which counter bucket the ticket was in before this save
+    instance._previous_bucket = None
+    loaded = getattr(instance, '_loaded_values', {})
+    if all(field in loaded for field in BUCKET_FIELDS):
+        instance._previous_bucket = ticket_bucket_from(loaded)
+    elif instance.pk:
+        # Built by hand or loaded with the bucket fields deferred
+        row = Ticket.objects.filter(pk=instance.pk).values(*BUCKET_FIELDS).first()
+        instance._previous_bucket = row
+
+
+@receiver(post_save, sender=Ticket)
+def update_ticket_counters(sender, instance, created, **kwargs):
+    # Ticket.save() wraps this in the same transaction as the row
+    previous = getattr(instance, '_previous_bucket', None)
+    current = ticket_bucket(instance)
+    # Until the row commits, a later save of this instance reads the stored bucket again;
+    # if the transaction rolls back, that is still the old one
+    loaded = instance.__dict__.pop('_loaded_values', {})
+    transaction.on_commit(lambda: setattr(instance, '_loaded_values', {**loaded, **current}))
+    if previous == current:
+        return
+    
+    if previous:
+        adjust_counter(previous, -1)
+    adjust_counter(current, 1)
+
+
+@receiver(post_delete, sender=Ticket)
+def delete_ticket_counters(sender, instance, **kwargs):
+    adjust_counter(ticket_bucket(instance), -1)
+
+
+@receiver(post_save, sender=Ticket)
+def index_ticket(sender, instance, **kwargs):
+    search.index_ticket(instance)
+
+
+@receiver(m2m_changed, sender=Ticket.assignee.through)
+def index_ticket_assignees(sender, instance, action, reverse, pk_set, **kwargs):
+    # Assignee usernames are part of the ticket document
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        for ticket in Ticket.objects.filter(pk__in=pk_set or []):
+            search.index_ticket(ticket)
+    else:
+        search.index_ticket(instance)
+
+
+@receiver(post_save, sender=Message)
+def index_message(sender, instance, **kwargs):
+    search.index_message(instance)
+
+
+@receiver(post_delete, sender=Message)
+def remove_message(sender, instance, **kwargs):
+    search.remove('message', instance.id)
+
+
+@receiver(post_save, sender=TicketHistory)
+def index_history(sender, instance, **kwargs):
+    search.index_history(instance)
+
+
+@receiver(post_delete, sender=TicketHistory)
+def remove_history(sender, instance, **kwargs):
+    search.remove('history', instance.id)
+
+
+# Page fragment invalidation, see tickets/cache.py
+
+@receiver(post_save, sender=Ticket)
+def bump_ticket_version(sender, instance, **kwargs):
+    bump_version(instance.id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=TicketHistory)
+@receiver(post_delete, sender=TicketHistory)
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+def bump_related_ticket_version(sender, instance, **kwargs):
+    bump_version(instance.ticket_id)
+
+
+@receiver(m2m_changed, sender=Ticket.assignee.through)
+def bump_assigned_ticket_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    # The header lists the assignees
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_version(instance.id)
+    elif action == 'pre_clear':
+        instance._cleared_ticket_ids = list(instance.assignee.values_list('id', flat=True))
+    elif action == 'post_clear':
+        bump_version(*getattr(instance, '_cleared_ticket_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        bump_version(*(pk_set or []))
+
+
+# Per-request permission answers, see tickets/permissions.py
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=CustomUser)
+def forget_permissions(sender, **kwargs):
+    # A new host, project owner or role may change any answer already given
+    permissions.invalidate()
+
+
+@receiver(m2m_changed, sender=Ticket.assignee.through)
+def forget_assignee_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        permissions.invalidate()
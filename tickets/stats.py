@@ -0,0 +1,102 @@
+from django.db.models import Count, Sum
+from django.utils.dateparse import parse_date
+
+from .models import Ticket, TicketCounter
+
+# Order of the labels shown on the dashboard charts
+PRIORITY_LABELS = ['High', 'Medium', 'Low', 'None']
+TYPE_LABELS = [value for value, label in Ticket.TYPE]
+STATUS_LABELS = [(True, 'Open'), (False, 'Closed')]
+
+
+def integer_param(params, name):
+    # None when absent; ValueError, which the views answer with a 400, when not an id
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer') from None
+
+
+def filter_tickets(tickets, params):
+    # Scope the tickets by the optional project, assignee and date range parameters.
+    # Raises ValueError for parameters that are not valid.
+    project = integer_param(params, 'project')
+    if project is not None:
+        tickets = tickets.filter(project_id=project)
+
+    assignee = integer_param(params, 'assignee')
+    if assignee is not None:
+        tickets = tickets.filter(assignee__id=assignee)
+
+    start = parse_date(params.get('start') or '')
+    if start:
+        tickets = tickets.filter(created__date__gte=start)
+
+    end = parse_date(params.get('end') or '')
+    if end:
+        tickets = tickets.filter(created__date__lte=end)
+
+    return tickets
+
+
+def breakdown(buckets):
+    # Fold (priority, type, status, count) buckets into the three chart series
+    priority = dict.fromkeys(PRIORITY_LABELS, 0)
+    types = dict.fromkeys(TYPE_LABELS, 0)
+    status = {value: 0 for value, label in STATUS_LABELS}
+
+    for bucket in buckets:
+        if bucket['priority'] in priority:
+            priority[bucket['priority']] += bucket['count']
+        if bucket['type'] in types:
+            types[bucket['type']] += bucket['count']
+        if bucket['status'] in status:
+            status[bucket['status']] += bucket['count']
+
+    return {
+        'priority': {'labels': PRIORITY_LABELS, 'values': list(priority.values())},
+        'type': {'labels': TYPE_LABELS, 'values': list(types.values())},
+        'status': {
+            'labels': [label for value, label in STATUS_LABELS],
+            'values': [status[value] for value, label in STATUS_LABELS],
+        },
+    }
+
+
+def ticket_stats(tickets=None):
+    # One GROUP BY query over the tickets instead of a COUNT per value
+    if tickets is None:
+        tickets = Ticket.objects.all()
+
+    buckets = (tickets.order_by()
+               .values('priority', 'type', 'status')
+               .annotate(count=Count('id', distinct=True)))
+
+    return breakdown(buckets)
+
+
+def counter_stats(project=None):
+    # Same breakdowns read from the materialized counters, O(number of buckets)
+    counters = TicketCounter.objects.all()
+    if project:
+        counters = counters.filter(project_id=project)
+
+    buckets = (counters.order_by()
+               .values('priority', 'type', 'status')
+               .annotate(count=Sum('count')))
+
+    return breakdown(buckets)
+
+
+def dashboard_stats(params):
+    # The counters only cover project scoping; assignee and date filters need the ticket table
+    if any(params.get(key) for key in ('assignee', 'start', 'end')):
+        return ticket_stats(filter_tickets(Ticket.objects.all(), params))
+    return counter_stats(integer_param(params, 'project'))
+
+
+def ticket_total():
+    return TicketCounter.objects.aggregate(total=Sum('count'))['total'] or 0
@@ -0,0 +1,12 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, param, cursor):
+    # Current query string with the cursor for one paginator swapped in, so search terms and
+    # the other paginators on the page keep their place
+    query = context['request'].GET.copy()
+    query[param] = cursor
+    return '?' + query.urlencode()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from projects.models import Project
+from users.models import CustomUser
+
+from .models import Category, Ticket
+
+
+class QueryCountMixin:
+    # For TestCase subclasses: check a page costs the same number of queries however many rows it lists
+
+    def count_queries(self, url, params=None):
+        # Measure every request from a cold cache so cached fragments don't skew the comparison
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, add_rows, params=None):
+        # The first request warms up per-process caches (content types, sessions) before measuring
+        self.count_queries(url, params)
+        before = self.count_queries(url, params)
+        add_rows()
+        after = self.count_queries(url, params)
+        self.assertEqual(before, after, f'{url} went from {before} to {after} queries after adding rows')
+
+
+class TicketListingMixin(QueryCountMixin):
+    # For TestCase subclasses: a logged-in user and a project whose ticket tables grow through add_tickets()
+
+    def set_up_listing(self, **user_fields):
+        self.user = CustomUser.objects.create_user(username='lister', password='testpass', **user_fields)
+        self.client.login(username='lister', password='testpass')
+        self.project = Project.objects.create(name='Listing Project', description='Listing')
+        self.category = Category.objects.create(name='Listing')
+        self.developers = [CustomUser.objects.create_user(username=f'dev{i}', password='testpass') for i in range(3)]
+        self.add_tickets(1)
+
+    def add_tickets(self, count):
+        # Hosted by and assigned to the user, so they show on every ticket table, with each related column filled in
+        for i in range(count):
+            ticket = Ticket.objects.create(project=self.project, host=self.user, category=self.category, name=f'Ticket {i}')
+            ticket.assignee.set(self.developers + [self.user])
+
+    def assertListingQueriesConstant(self, url):
+        self.assertConstantQueries(url, lambda: self.add_tickets(4))
+
+
+class TempMediaMixin:
+    # For TestCase subclasses: point MEDIA_ROOT at a throwaway directory for each test
+
+    def use_temp_media(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        # New profiles point at the default picture
+        shutil.copy(os.path.join(settings.MEDIA_ROOT, 'default.jpg'), self.media)
+        media_settings = override_settings(MEDIA_ROOT=self.media,
+                                           ATTACHMENT_UPLOAD_DIR=os.path.join(self.media, 'uploads'))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import Attachment, UploadSession
+
+# Bytes read from the request or a file at a time; memory per upload never exceeds this
+CHUNK_SIZE = 64 * 1024
+
+# How long a request may hold an upload's offset while writing one chunk
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Running SHA-256 state per upload so each chunk is hashed once. Other processes
+# (or this one after eviction) rebuild it from the .part file when needed.
+MAX_HASHERS = 256
+_hashers = OrderedDict()
+
+
+class UploadConflict(Exception):
+    # The chunk does not start where the server expects; the client should resume from the stored offset
+    pass
+
+
+def upload_dir():
+    return getattr(settings, 'ATTACHMENT_UPLOAD_DIR', os.path.join(settings.MEDIA_ROOT, 'uploads'))
+
+
+def part_path(session):
+    return os.path.join(upload_dir(), f'{session.id}.part')
+
+
+def blob_name(digest, filename):
+    # Content addressed: identical files (with the same extension) share one stored blob
+    extension = os.path.splitext(filename)[1].lower()[:16]
+    return f'attachments/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def hash_stream(stream, hasher=None, limit=None):
+    hasher = hasher or hashlib.sha256()
+    size = 0
+    while limit is None or size < limit:
+        chunk = stream.read(CHUNK_SIZE if limit is None else min(CHUNK_SIZE, limit - size))
+        if not chunk:
+            break
+        hasher.update(chunk)
+        size += len(chunk)
+    return hasher, size
+
+
+def store_blob(name, fileobj):
+    # Skip the write entirely when the blob is already stored
+    if not default_storage.exists(name):
+        fileobj.seek(0)
+        saved = default_storage.save(name, File(fileobj))
+        if saved != name:
+            # Another request stored the same content in between; keep the first copy
+            default_storage.delete(saved)
+    return name
+
+
+def store_file(ticket, uploaded_file):
+    # Hash and store a file that came in through a regular multipart form; returns an unsaved Attachment
+    hasher, size = hash_stream(uploaded_file)
+    digest = hasher.hexdigest()
+    name = store_blob(blob_name(digest, uploaded_file.name), uploaded_file)
+    return Attachment(ticket=ticket, file=name, filename=os.path.basename(uploaded_file.name),
+                      sha256=digest, size=size)
+
+
+def start_upload(ticket, user, filename, size):
+    session = UploadSession.objects.create(ticket=ticket, user=user, filename=os.path.basename(filename), size=size)
+    os.makedirs(upload_dir(), exist_ok=True)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def session_hasher(session):
+    entry = _hashers.pop(session.id, None)
+    if entry is None or entry[0] != session.received:
+        # Rebuild the running hash from what is already on disk
+        with open(part_path(session), 'rb') as part:
+            hasher, size = hash_stream(part, limit=session.received)
+        entry = (size, hasher)
+    return entry[1]
+
+
+def remember_hasher(session, hasher):
+    _hashers[session.id] = (session.received, hasher)
+    while len(_hashers) > MAX_HASHERS:
+        _hashers.popitem(last=False)
+
+
+def claim_offset(session, offset):
+    # Only one writer may hold the offset; a claim older than CLAIM_TIMEOUT was left by a dead request
+    now = timezone.now()
+    free = Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT)
+    if not UploadSession.objects.filter(free, id=session.id, received=offset, blob='').update(claimed_at=now):
+        raise UploadConflict()
+    return now
+
+
+def write_chunk(session, offset, stream):
+    # Append a chunk at offset, streaming it to disk and into the hash; returns the new offset
+    if session.complete or offset != session.received:
+        raise UploadConflict()
+
+    # Claim the offset before touching the part file, so a losing writer never overwrites the winner's bytes
+    claim = claim_offset(session, offset)
+    claimed = UploadSession.objects.filter(id=session.id, claimed_at=claim)
+    try:
+        hasher = session_hasher(session)
+        received = offset
+        with open(part_path(session), 'r+b') as part:
+            # Writing at the offset and truncating makes retried chunks idempotent
+            part.seek(offset)
+            while received < session.size:
+                chunk = stream.read(min(CHUNK_SIZE, session.size - received))
+                if not chunk:
+                    break
+                part.write(chunk)
+                hasher.update(chunk)
+                received += len(chunk)
+            part.truncate()
+    except BaseException:
+        # The offset stays where it was; the next chunk rewrites from there
+        claimed.update(claimed_at=None)
+        _hashers.pop(session.id, None)
+        raise
+
+    if not claimed.filter(received=offset).update(received=received, claimed_at=None):
+        # Held longer than CLAIM_TIMEOUT and taken over by a retry
+        _hashers.pop(session.id, None)
+        raise UploadConflict()
+    session.received = received
+    remember_hasher(session, hasher)
+
+    if received == session.size:
+        finish_upload(session, hasher.hexdigest())
+    return received
+
+
+def finish_upload(session, digest):
+    name = blob_name(digest, session.filename)
+    path = part_path(session)
+    if default_storage.exists(name):
+        os.remove(path)
+    else:
+        try:
+            target = default_storage.path(name)
+        except NotImplementedError:
+            with open(path, 'rb') as part:
+                store_blob(name, part)
+            os.remove(path)
+        else:
+            # Same filesystem as MEDIA_ROOT, so this is a rename rather than a copy
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+    _hashers.pop(session.id, None)
+
+    session.sha256 = digest
+    session.blob = name
+    session.save(update_fields=['sha256', 'blob', 'updated'])
+
+
+def attach_uploads(ticket, sessions):
+    # Turn finished uploads into attachments with a single INSERT
+    attachments = Attachment.objects.bulk_create([
+        Attachment(ticket=ticket, file=session.blob, filename=session.filename,
+                   sha256=session.sha256, size=session.size)
+        for session in sessions
+    ])
+    UploadSession.objects.filter(id__in=[session.id for session in sessions]).delete()
+    # bulk_create sends no post_save, so refresh the cached ticket page here
+    bump_version(ticket.id)
+    return attachments
+
+
+def discard_upload(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    _hashers.pop(session.id, None)
+    session.delete()
@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('tickets/', views.ticket_home, name='ticket-home'),
     path('ticket/<int:pk>', views.ticket, name='ticket'),
+    path('stats/', views.get_stats_data, name='stats-data'),
     path('ticket_data/', views.get_ticket_data, name='ticket-data'),
     path('type_data/', views.get_type_data, name='type-data'),
     path('status_data/', views.get_status_data, name='status-data'),
@@ -13,6 +14,13 @@ urlpatterns = [
     path('update-ticket/<int:pk>/', views.updateTicket, name='update-ticket'),
     path('delete-ticket/<int:pk>/', views.deleteTicket, name='delete-ticket'),
     path('delete-message/<int:pk>/', views.deleteMessage, name='delete-message'),
+
+    path('ticket/<int:pk>/uploads/', views.startUpload, name='start-upload'),
+    path('uploads/<uuid:upload_id>/', views.uploadChunk, name='upload-chunk'),
+    path('ticket/<int:pk>/attachments/', views.attachUploads, name='attach-uploads'),
+
+    path('export/tickets/', views.exportTickets, name='export-tickets'),
+    path('export/activity/', views.exportActivity, name='export-activity'),
     
     path('categories/', views.categoriesPage, name='categories'),
     path('activity/', views.activityPage, name='activity'),
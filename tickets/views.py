@@ -1,11 +1,26 @@
-from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
-from django.core.paginator import Paginator
-from .models import Ticket, TicketHistory, Attachment, Category, Message
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from .models import Ticket, TicketHistory, Attachment, Category, Message, UploadSession
 from .forms import TicketForm
+from .stats import dashboard_stats, ticket_total
+from .search import search_tickets, search_messages, search_history
+from .pagination import CursorPaginator
+from .history import attach_revisions, record_change, snapshot
+from .cache import bump_version, ticket_fragments
+from .export import CONTENT_TYPES, export_lines, export_tickets
+from .permissions import permissions_for
+from .uploads import UploadConflict, attach_uploads, discard_upload, start_upload, store_file, write_chunk
 from projects.models import Project
 from users.models import CustomUser
 from notifications.models import Notification
@@ -14,83 +29,59 @@ from notifications.models import Notification
 def home(request):
     q = request.GET.get('q') if request.GET.get('q') != None else ''
 
-    tickets = Ticket.objects.filter(
-        Q(category__name__icontains=q) |
-        Q(name__icontains=q) |
-        Q(description__icontains=q)
-    )
+    tickets = Ticket.objects.all()
+    if q:
+        tickets = search_tickets(tickets, q)
     
     
     context = {'tickets': tickets}
     
     return render(request, 'dashboard/dashboard.html', context)
 
+def stats_response(request, series=None):
+    try:
+        stats = dashboard_stats(request.GET)
+    except ValueError as error:
+        # Ids and dates that do not parse, answered as the exports answer them
+        return JsonResponse({'error': str(error)}, status=400)
+    if series:
+        return JsonResponse({'values': stats[series]['values']})
+    return JsonResponse(stats)
+
+def get_stats_data(request):
+    # Priority, type and status breakdowns from the ticket counters
+    return stats_response(request)
+
 def get_ticket_data(request):
-    high_priority = Ticket.objects.filter(priority='High').count()
-    medium_priority = Ticket.objects.filter(priority='Medium').count()
-    low_priority = Ticket.objects.filter(priority='Low').count()
-    none_priority = Ticket.objects.filter(priority='None').count()
-    
-    data = {
-        'values': [high_priority, medium_priority, low_priority, none_priority]
-    }
-    
-    return JsonResponse(data)
+    return stats_response(request, 'priority')
 
 
 def get_type_data(request):
-    misc_type = Ticket.objects.filter(type='Misc').count()
-    bug_type = Ticket.objects.filter(type='Bug').count()
-    help_type = Ticket.objects.filter(type='Help Needed').count()
-    concern_type = Ticket.objects.filter(type='Concern').count()
-    question_type = Ticket.objects.filter(type='Question').count()
-    
-    data = {
-        'values': [misc_type, bug_type, help_type, concern_type, question_type]
-    }
-    
-    return JsonResponse(data)
+    return stats_response(request, 'type')
 
 def get_status_data(request):
-    open_status = Ticket.objects.filter(status=True).count()
-    close_status = Ticket.objects.filter(status=False).count()
-    
-    data = {
-        'values': [open_status, close_status]
-    }
-    
-    return JsonResponse(data)
+    return stats_response(request, 'status')
 
 
 def ticket_home(request): 
-    tickets = Ticket.objects.all()
+    tickets = Ticket.objects.for_listing()
     search_query = request.GET.get('search')
     
     categories = Category.objects.all()[0:5]
-    ticket_count = tickets.count()
+    ticket_count = ticket_total()
     
     
     if request.user.is_authenticated:
-        user = request.user
-        tickets = tickets.filter(Q(host=user) | Q(assignee=user))
+        tickets = tickets.visible_to(request.user, 'involved_ticket')
     
     # Filter tickets based on a search query
     if search_query:
-        tickets = tickets.filter(
-            Q(host__username__icontains=search_query) | 
-            Q(assignee__username__icontains=search_query) |
-            Q(category__name__icontains=search_query) |
-            Q(name__icontains=search_query) |
-            Q(status__icontains=search_query) |
-            Q(priority__icontains=search_query) |
-            Q(type__icontains=search_query)
-        )
+        tickets = search_tickets(tickets, search_query)
     
     
     # Paginate the ticket table
-    paginator = Paginator(tickets, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(tickets, 5, estimate=True)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     
     context = {'tickets': tickets, 'categories': categories,
@@ -101,9 +92,6 @@ def ticket_home(request):
 # Ticket detail page
 def ticket(request, pk):
     ticket = Ticket.objects.get(id=pk)
-    ticket_messages = ticket.message_set.all()
-    ticket_history = ticket.history.all()
-    ticket_attachments = ticket.attachments.all()
     
     # POST method that creates a message to leave a comment
     if request.method == 'POST':
@@ -118,59 +106,73 @@ def ticket(request, pk):
         
         else:
             # if the 'body' field is not present, should be creating a new attachment 
-            for file in request.FILES.getlist('files'):
-                Attachment.objects.create(
-                    file=file,
-                    ticket=ticket
-                )
+            Attachment.objects.bulk_create([store_file(ticket, file) for file in request.FILES.getlist('files')])
+            # bulk_create sends no post_save
+            bump_version(ticket.id)
             
         return redirect('ticket', pk=ticket.id)
 
-    # Get the search query from the request's GET parameters
-    search_query = request.GET.get('q')
-    
-    # Filter the results based on the search query
-    if search_query:
-        ticket_messages = ticket_messages.filter(Q(user__username__icontains=search_query) | 
-                                                 Q(body__icontains=search_query))
-        
-        ticket_history = ticket_history.filter(Q(name__icontains=search_query) |
-                                               Q(description__icontains=search_query) |
-                                               Q(updated_by__username__icontains=search_query))
-        
-        ticket_attachments = ticket_attachments.filter(Q(file__icontains=search_query) |
-                                                Q(created__icontains=search_query))
-    
-    # Set the number of items you want to display on each page
-    messages_per_page = 5
-    history_per_page = 5
-    attachments_per_page = 5
-    
-    # Create a paginator object for each queryset
-    messages_paginator = Paginator(ticket_messages, messages_per_page)
-    history_paginator = Paginator(ticket_history, history_per_page)
-    attachments_paginator = Paginator(ticket_attachments, attachments_per_page)
-
-    # Get the current page number from the request's GET parameters 
-    messages_page_number = request.GET.get('messages_page')
-    history_page_number = request.GET.get('history_page')
-    attachments_page_number = request.GET.get('attachments_page')
-
-    # Get the current page object for each queryset
-    messages_page_obj = messages_paginator.get_page(messages_page_number)
-    history_page_obj = history_paginator.get_page(history_page_number)
-    attachments_page_obj = attachments_paginator.get_page(attachments_page_number)
-    
+    # The header only offers the links the user may follow
+    permissions = permissions_for(request.user)
+    allowed = {action: permissions.can(action, ticket) for action in ('change_ticket', 'delete_ticket')}
+    
+    # Each card is cached per ticket version; the tabs also vary with their page cursors and the search query,
+    # the header with the links it offers
+    fragments = ticket_fragments(request, ticket, {
+        'header': lambda request, ticket: ticket_header(request, ticket, allowed),
+        'messages': ticket_messages_tab,
+        'history': ticket_history_tab,
+        'attachments': ticket_attachments_tab,
+    }, vary_on_query=('messages', 'history', 'attachments'),
+        vary_on={'header': ','.join(action for action, granted in allowed.items() if granted)})
     
     context = {
         'ticket': ticket, 
-        'ticket_messages': messages_page_obj, 
-        'ticket_history': history_page_obj,
-        'ticket_attachments': attachments_page_obj,
-        'search_query': search_query,
+        'fragments': fragments,
+        'search_query': request.GET.get('q'),
     }
     return render(request, 'tickets/ticket.html', context)
 
+
+# Fragments of the ticket detail page, only built on a cache miss
+def ticket_header(request, ticket, allowed):
+    ticket = Ticket.objects.select_related('host').prefetch_related('assignee').get(id=ticket.id)
+    return render_to_string('tickets/partials/ticket_header.html', {'ticket': ticket, 'allowed': allowed}, request)
+
+
+def ticket_messages_tab(request, ticket):
+    ticket_messages = ticket.message_set.select_related('user')
+    search_query = request.GET.get('q')
+    if search_query:
+        ticket_messages = search_messages(ticket_messages, search_query, ticket)
+    
+    page_obj = CursorPaginator(ticket_messages, 5).get_page(request.GET.get('messages_page'))
+    return render_to_string('tickets/partials/ticket_messages.html', {'ticket_messages': page_obj}, request)
+
+
+def ticket_history_tab(request, ticket):
+    ticket_history = ticket.history.select_related('updated_by').order_by('-created')
+    search_query = request.GET.get('q')
+    if search_query:
+        ticket_history = search_history(ticket_history, search_query, ticket)
+    
+    page_obj = CursorPaginator(ticket_history, 5).get_page(request.GET.get('history_page'))
+    # History rows only store diffs, rebuild the previous name and description they show
+    attach_revisions(ticket, page_obj)
+    return render_to_string('tickets/partials/ticket_history.html', {'ticket_history': page_obj}, request)
+
+
+def ticket_attachments_tab(request, ticket):
+    ticket_attachments = ticket.attachments.order_by('-created')
+    search_query = request.GET.get('q')
+    if search_query:
+        ticket_attachments = ticket_attachments.filter(Q(filename__icontains=search_query) |
+                                                Q(file__icontains=search_query) |
+                                                Q(created__icontains=search_query))
+    
+    page_obj = CursorPaginator(ticket_attachments, 5).get_page(request.GET.get('attachments_page'))
+    return render_to_string('tickets/partials/ticket_attachments.html', {'ticket_attachments': page_obj}, request)
+
 @login_required
 def createTicket(request):
     form = TicketForm()
@@ -189,48 +191,48 @@ def createTicket(request):
         assignee_ids = request.POST.getlist('assignee')
         assignee = CustomUser.objects.filter(id__in=assignee_ids)
         
-        ticket = Ticket.objects.create(
-            host = request.user,
-            category=category,
-            project=project,
-            name=request.POST.get('name'),
-            status=request.POST.get('status'),
-            priority=request.POST.get('priority'),
-            type=request.POST.get('type'),
-            description=request.POST.get('description'),
-        )
-        
-        # Add the selected users to the ticket
-        ticket.assignee.set(assignee)
+        # The ticket, its assignees and the outbox event written by post_save commit together
+        with transaction.atomic():
+            ticket = Ticket.objects.create(
+                host = request.user,
+                category=category,
+                project=project,
+                name=request.POST.get('name'),
+                status=request.POST.get('status'),
+                priority=request.POST.get('priority'),
+                type=request.POST.get('type'),
+                description=request.POST.get('description'),
+            )
+            
+            # Add the selected users to the ticket
+            ticket.assignee.set(assignee)
         
         return redirect('ticket', pk=ticket.id)
     
     context = {'form': form, 'categories': categories, 'users': users}
     return render(request, 'tickets/ticket_form.html', context)
 
+def permitted(request, queryset, action, pk):
+    # The permission rule is part of the lookup, so a refused user never loads the row
+    obj = permissions_for(request.user).filter(queryset, action).filter(pk=pk).first()
+    if obj is None:
+        # 404 when there is no such row at all, None when the user may not touch it
+        get_object_or_404(queryset.only('pk'), pk=pk)
+    return obj
+
 @login_required
 def updateTicket(request, pk):
-    ticket = Ticket.objects.get(id=pk)
+    ticket = permitted(request, Ticket.objects.all(), 'change_ticket', pk)
+    if ticket is None:
+        return HttpResponse('You are not allowed')
     form = TicketForm(instance=ticket)
     categories = Category.objects.all()
-    if request.user != ticket.host:
-        return HttpResponse('You are not allowed')
     
     if request.method == 'POST':
         category_name = request.POST.get('category')
         category, created = Category.objects.get_or_create(name=category_name)
-        
-        # create ticket history
-        history = TicketHistory(
-            ticket=ticket,
-            updated_by=request.user,
-            name=ticket.name,
-            status=ticket.status,
-            priority=ticket.priority,
-            type=ticket.type,
-            description=ticket.description,
-        )
-        history.save()
+        before = snapshot(ticket)
+        previous_category = ticket.category_id
 
         ticket.name = request.POST.get('name')
         ticket.category = category
@@ -238,7 +240,13 @@ def updateTicket(request, pk):
         ticket.priority = request.POST.get('priority')
         ticket.type = request.POST.get('type')
         ticket.description = request.POST.get('description')
-        ticket.save()
+        
+        # Submitting the form unchanged writes nothing
+        if snapshot(ticket) != before or ticket.category_id != previous_category:
+            with transaction.atomic():
+                ticket.save()
+                # create ticket history, holding only the fields that changed
+                record_change(ticket, before, request.user)
         
         return redirect('ticket', pk=ticket.id)
     
@@ -247,9 +255,8 @@ def updateTicket(request, pk):
 
 @login_required
 def deleteTicket(request, pk):
-    ticket = Ticket.objects.get(id=pk)
-    
-    if request.user != ticket.host:
+    ticket = permitted(request, Ticket.objects.all(), 'delete_ticket', pk)
+    if ticket is None:
         return HttpResponse('You are not allowed')
     
     if request.method == 'POST':
@@ -259,15 +266,125 @@ def deleteTicket(request, pk):
 
 @login_required
 def deleteMessage(request, pk):
-    message = Message.objects.get(id=pk)
-    
-    if request.user != message.user:
+    message = permitted(request, Message.objects.all(), 'delete_message', pk)
+    if message is None:
         return HttpResponse('You are not allowed')
     
     if request.method == 'POST':
         message.delete()
         return redirect(request, 'tickets/delete.html', {'obj': message})
     
+# Chunked attachment uploads, used by the attachment form's script
+def upload_status(session):
+    return {
+        'id': str(session.id),
+        'url': reverse('upload-chunk', args=[session.id]),
+        'offset': session.received,
+        'size': session.size,
+        'complete': session.complete,
+    }
+
+
+def request_data(request):
+    # The upload endpoints accept either form fields or a JSON body
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+@login_required
+@require_POST
+def startUpload(request, pk):
+    ticket = get_object_or_404(Ticket, id=pk)
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    filename = data.get('filename')
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        size = -1
+    if not filename or size < 0:
+        return JsonResponse({'error': 'filename and size are required'}, status=400)
+    if size > settings.ATTACHMENT_MAX_UPLOAD_SIZE:
+        return JsonResponse({'error': 'File is too large'}, status=413)
+
+    session = start_upload(ticket, request.user, filename, size)
+    return JsonResponse(upload_status(session), status=201)
+
+
+@login_required
+def uploadChunk(request, upload_id):
+    session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+
+    if request.method == 'PUT':
+        # The request body is read straight from the stream, never loaded into memory
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset header is required'}, status=400)
+        try:
+            write_chunk(session, offset, request)
+        except UploadConflict:
+            # Tell the client where to resume from
+            session.refresh_from_db()
+            return JsonResponse(upload_status(session), status=409)
+
+    elif request.method == 'DELETE':
+        discard_upload(session)
+        return HttpResponse(status=204)
+
+    return JsonResponse(upload_status(session))
+
+
+@login_required
+@require_POST
+def attachUploads(request, pk):
+    ticket = get_object_or_404(Ticket, id=pk)
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    upload_ids = data.getlist('uploads') if hasattr(data, 'getlist') else data.get('uploads') or []
+
+    try:
+        sessions = list(UploadSession.objects.filter(id__in=upload_ids, ticket=ticket, user=request.user)
+                        .exclude(blob=''))
+    except ValidationError:
+        return JsonResponse({'error': 'Invalid upload id'}, status=400)
+
+    attachments = attach_uploads(ticket, sessions)
+    return JsonResponse({'success': True, 'attached': len(attachments)})
+
+
+# Streaming exports for reporting; ?format=csv|jsonl with the dashboard's project, start and end filters and status
+def export_response(request, dataset):
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in CONTENT_TYPES:
+        return JsonResponse({'error': 'format must be csv or jsonl'}, status=400)
+    try:
+        tickets = export_tickets(request.GET, Ticket.objects.visible_to(request.user))
+    except (ValueError, ValidationError) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    response = StreamingHttpResponse(export_lines(dataset, file_format, tickets), content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+    return response
+
+
+@login_required
+def exportTickets(request):
+    return export_response(request, 'tickets')
+
+
+@login_required
+def exportActivity(request):
+    return export_response(request, 'activity')
+
+
 def categoriesPage(request):
     q = request.GET.get('q') if request.GET.get('q') != None else ''
     categories = Category.objects.filter(name__icontains=q)
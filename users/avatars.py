@@ -0,0 +1,102 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+
+from .models import Profile
+
+# Longest side in pixels of each derivative, by where it is shown
+AVATAR_SIZES = {
+    'list': 48,
+    'navbar': 64,
+    'profile': 300,
+}
+
+
+def pending_profiles():
+    # Profiles whose picture changed since their derivatives were built
+    return Profile.objects.exclude(avatar_source=F('profile_pic'))
+
+
+def file_digest(name):
+    hasher = hashlib.sha256()
+    with default_storage.open(name, 'rb') as source:
+        for chunk in iter(lambda: source.read(64 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def derivative_name(digest, size, extension):
+    # Named by the source's content, so identical pictures (like default.jpg) share derivatives
+    return f'avatars/{digest[:2]}/{digest}-{size}.{extension}'
+
+
+def render(image, pixels):
+    from PIL import ImageOps
+
+    resized = ImageOps.fit(image, (pixels, pixels)) if min(image.size) > pixels else image.copy()
+    output = BytesIO()
+    if resized.mode in ('RGBA', 'LA') or 'transparency' in resized.info:
+        resized.save(output, 'PNG', optimize=True)
+        return output.getvalue(), 'png'
+    resized.convert('RGB').save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+    return output.getvalue(), 'jpg'
+
+
+def build_derivatives(name, digest):
+    # Pillow is only imported here, in the worker, never on the request path
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    existing = {}
+    for size in AVATAR_SIZES:
+        for extension in ('jpg', 'png'):
+            candidate = derivative_name(digest, size, extension)
+            if default_storage.exists(candidate):
+                existing[size] = candidate
+    if len(existing) == len(AVATAR_SIZES):
+        return existing
+
+    try:
+        with default_storage.open(name, 'rb') as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+    except (UnidentifiedImageError, OSError):
+        # Not an image we can read; templates fall back to the original file
+        return {}
+
+    avatars = {}
+    for size, pixels in AVATAR_SIZES.items():
+        data, extension = render(image, pixels)
+        target = derivative_name(digest, size, extension)
+        if not default_storage.exists(target):
+            default_storage.save(target, ContentFile(data))
+        avatars[size] = target
+    return avatars
+
+
+def process_profile(profile):
+    name = profile.profile_pic.name
+    try:
+        digest = file_digest(name)
+    except FileNotFoundError:
+        digest, avatars = '', {}
+    else:
+        # Re-saving the same picture costs a hash, not a re-encode
+        if digest == profile.avatar_digest and profile.avatars:
+            avatars = profile.avatars
+        else:
+            avatars = build_derivatives(name, digest)
+
+    # If the picture changed again while we worked, leave the profile pending for the next pass
+    return Profile.objects.filter(id=profile.id, profile_pic=name).update(
+        avatar_source=name, avatar_digest=digest, avatars=avatars)
+
+
+def process_pending(batch_size=100):
+    profiles = pending_profiles().only('id', 'profile_pic', 'avatar_source', 'avatar_digest', 'avatars')
+    processed = 0
+    for profile in profiles.order_by('id')[:batch_size]:
+        processed += process_profile(profile)
+    return processed
@@ -1,26 +1,21 @@
 from django.contrib.auth.decorators import user_passes_test
 from django.http import HttpResponseForbidden
 
-def admin_required(view_func):
-    def wrapper_func(request, *args, **kwargs):
-        if request.user.account_type == 'admin':
-            return view_func(request, *args, **kwargs)
-        else:
-            return HttpResponseForbidden()
-    return wrapper_func
+from tickets.permissions import permissions_for
 
-def developer_required(view_func):
-    def wrapper_func(request, *args, **kwargs):
-        if request.user.account_type == 'developer':
-            return view_func(request, *args, **kwargs)
-        else:
-            return HttpResponseForbidden()
-    return wrapper_func
+def role_required(*roles):
+    # Role checks go through the same permission engine as ticket actions
+    def decorator(view_func):
+        def wrapper_func(request, *args, **kwargs):
+            if permissions_for(request.user).has_role(*roles):
+                return view_func(request, *args, **kwargs)
+            else:
+                return HttpResponseForbidden()
+        return wrapper_func
+    return decorator
 
-def project_manager_required(view_func):
-    def wrapper_func(request, *args, **kwargs):
-        if request.user.account_type == 'project_manager':
-            return view_func(request, *args, **kwargs)
-        else:
-            return HttpResponseForbidden()
-    return wrapper_func
\ No newline at end of file
+admin_required = role_required('admin')
+
+developer_required = role_required('developer')
+
+project_manager_required = role_required('project_manager')
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.avatars import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Build the resized profile picture derivatives for profiles whose picture changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process everything pending once and exit')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when nothing is pending')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def drain(self, batch_size):
+        total = 0
+        while True:
+            processed = process_pending(batch_size)
+            total += processed
+            if processed < batch_size:
+                return total
+
+    def handle(self, *args, **options):
+        if options['once']:
+            total = self.drain(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Processed {total} profile picture(s)'))
+            return
+
+        self.stdout.write('Processing profile pictures, press Ctrl+C to stop')
+        try:
+            while True:
+                total = self.drain(options['batch_size'])
+                if total:
+                    self.stdout.write(f'Processed {total} profile picture(s)')
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
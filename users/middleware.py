@@ -1,13 +1,35 @@
+from django.conf import settings
 from django.shortcuts import redirect
-from django.urls import reverse
+from django.urls import NoReverseMatch, reverse
+
+def compile_exemptions(entries):
+    # Split LOGIN_EXEMPT_URLS into exact paths (URL names, reversed here once) and path prefixes
+    paths, prefixes = set(), []
+    for entry in entries:
+        if entry.startswith('/'):
+            prefixes.append(entry)
+        elif '://' not in entry:
+            # Absolute URLs (e.g. a STATIC_URL on a CDN) never reach this server
+            try:
+                paths.add(reverse(entry))
+            except NoReverseMatch:
+                paths.add('/' + entry.lstrip('/'))
+    return frozenset(paths), tuple(prefixes)
 
 class RequireLoginMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        # Resolved once per process instead of on every request
+        self.login_url = reverse('login')
+        self.exempt_paths, self.exempt_prefixes = compile_exemptions(
+            ['login', 'register'] + list(getattr(settings, 'LOGIN_EXEMPT_URLS', [])))
     
     def __call__(self, request):
-        # Exclude the login and registration pages from redirection
-        if not request.user.is_authenticated and request.path not in [reverse('login'), reverse('register')]:
+        path = request.path_info
+        # Exempt paths never touch request.user, so the session is not loaded for them
+        if path in self.exempt_paths or path.startswith(self.exempt_prefixes):
+            return self.get_response(request)
+        if not request.user.is_authenticated:
             # Redirect to the login page
-            return redirect(reverse('login'))
-        return self.get_response(request)
\ No newline at end of file
+            return redirect(self.login_url)
+        return self.get_response(request)
@@ -2,7 +2,6 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from PIL import Image
 # Create your models here.
 
 class CustomUser(AbstractUser):
@@ -18,27 +17,23 @@ class Profile(models.Model):
     account_type = models.CharField(max_length=20, choices=CustomUser.ACCOUNT_TYPE_CHOICES)
     profile_pic = models.ImageField(default='default.jpg', upload_to='profile_pics')
     bio = models.TextField(blank=True)
+    # Resized copies of profile_pic, built by the process_avatars worker (users/avatars.py).
+    # They are stale whenever avatar_source no longer matches profile_pic.
+    avatar_source = models.CharField(max_length=255, blank=True)
+    avatar_digest = models.CharField(max_length=64, blank=True)
+    avatars = models.JSONField(default=dict, blank=True)
     
     def __str__(self):
         return self.user.username
     
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-
-        img = Image.open(self.profile_pic.path)
-
-        if img.height > 300 or img.width > 300:
-            output_size = (300, 300)
-            img.thumbnail(output_size)
-            img.save(self.profile_pic.path)
+    def avatar_name(self, size):
+        # Storage name of a derivative, or None until the worker has caught up with profile_pic
+        if self.avatar_source != self.profile_pic.name:
+            return None
+        return self.avatars.get(size)
     
 
 @receiver(post_save, sender=CustomUser)
 def create_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.create(user=instance)
-
-
-@receiver(post_save, sender=CustomUser)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+        Profile.objects.create(user=instance)
\ No newline at end of file
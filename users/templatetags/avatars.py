@@ -0,0 +1,13 @@
+from django import template
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(profile, size='profile'):
+    # URL of a resized profile picture, falling back to the original until the worker has built it
+    name = profile.avatar_name(size)
+    if name:
+        return default_storage.url(name)
+    return profile.profile_pic.url
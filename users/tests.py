@@ -1,10 +1,25 @@
+from io import BytesIO, StringIO
+from datetime import timedelta
+from unittest import mock
 from django.urls import reverse
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.utils import timezone
 from .forms import UserRegisterForm
 from users.models import CustomUser
 from tickets.models import Ticket
 from django.http import HttpResponse, HttpRequest, HttpResponseForbidden
 from . decorators import admin_required, developer_required, project_manager_required
+from projects.models import Project
+from tickets.testing import TempMediaMixin, TicketListingMixin
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template import Context, Template
+from PIL import Image
+from .avatars import AVATAR_SIZES, pending_profiles, process_pending
 
 # Create your tests here.
 
@@ -272,4 +287,127 @@ class ProjectManagerRequiredDecoratorTest(TestCase):
         """
         Test view that requires project manager permission.
         """
-        return HttpResponse('This is a test view')
\ No newline at end of file
+        return HttpResponse('This is a test view')
+
+
+class TicketListingQueryTest(TicketListingMixin, TestCase):
+    def setUp(self):
+        self.set_up_listing(account_type='admin')
+        
+    def test_profile_query_count(self):
+        self.assertListingQueriesConstant(reverse('profile'))
+    
+    def test_manage_users_query_count(self):
+        self.assertListingQueriesConstant(reverse('manage-users'))
+
+
+class AvatarPipelineTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media()
+        self.user = CustomUser.objects.create_user(username='avatar', password='testpass')
+        self.other = CustomUser.objects.create_user(username='avatar2', password='testpass')
+        
+    def upload_picture(self, profile, name='me.png', color='red'):
+        output = BytesIO()
+        Image.new('RGB', (800, 600), color).save(output, 'PNG')
+        profile.profile_pic.save(name, ContentFile(output.getvalue()))
+        
+    def test_login_does_not_open_images(self):
+        with mock.patch('PIL.Image.open', side_effect=AssertionError('Pillow used')):
+            self.assertTrue(self.client.login(username='avatar', password='testpass'))
+            self.user.save()
+            self.user.profile.save()
+            
+    def test_worker_builds_every_size(self):
+        self.upload_picture(self.user.profile)
+        self.assertIn(self.user.profile, pending_profiles())
+        process_pending()
+        
+        profile = self.user.profile
+        profile.refresh_from_db()
+        self.assertFalse(pending_profiles().exists())
+        self.assertEqual(set(profile.avatars), set(AVATAR_SIZES))
+        for size, pixels in AVATAR_SIZES.items():
+            name = profile.avatar_name(size)
+            self.assertIn(profile.avatar_digest, name)
+            with default_storage.open(name) as derivative:
+                self.assertEqual(Image.open(derivative).size, (pixels, pixels))
+                
+    def test_identical_pictures_share_derivatives(self):
+        # Both users start on default.jpg
+        process_pending()
+        first, second = self.user.profile, self.other.profile
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.avatars, second.avatars)
+        
+        # Uploading the same bytes again only costs a hash
+        self.upload_picture(first, 'a.png')
+        process_pending()
+        first.refresh_from_db()
+        with mock.patch('PIL.Image.open', side_effect=AssertionError('Pillow used')):
+            self.upload_picture(first, 'b.png')
+            process_pending()
+        first.refresh_from_db()
+        self.assertTrue(first.avatar_source.endswith('b.png'))
+        self.assertEqual(len(first.avatars), len(AVATAR_SIZES))
+        
+    def test_template_tag_falls_back_until_processed(self):
+        template = Template("{% load avatars %}{% avatar_url profile 'navbar' %}")
+        profile = self.user.profile
+        self.upload_picture(profile)
+        self.assertEqual(template.render(Context({'profile': profile})), profile.profile_pic.url)
+        
+        process_pending()
+        profile.refresh_from_db()
+        self.assertEqual(template.render(Context({'profile': profile})), default_storage.url(profile.avatars['navbar']))
+
+
+class RequireLoginMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='gatekeeper', password='testpass')
+        
+    def test_redirects_anonymous_users(self):
+        response = self.client.get(reverse('ticket-home'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('register')).status_code, 200)
+        
+    def test_exempt_paths_skip_the_session(self):
+        self.client.login(username='gatekeeper', password='testpass')
+        for url in (reverse('health'), '/static/missing.css'):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertNotEqual(response.status_code, 302, url)
+            self.assertFalse([query for query in context.captured_queries if 'django_session' in query['sql']], url)
+        self.assertEqual(self.client.get(reverse('health')).json(), {'status': 'ok'})
+        
+    def test_urls_resolved_once(self):
+        self.client.get(reverse('ticket-home'))
+        with mock.patch('users.middleware.reverse', side_effect=AssertionError('reversed per request')):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+        
+    @override_settings(LOGIN_EXEMPT_URLS=['/public/', 'ticket-home'])
+    def test_configurable(self):
+        self.assertEqual(self.client.get('/public/anything').status_code, 404)
+        self.assertEqual(self.client.get(reverse('ticket-home')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 302)
+
+
+class SessionCleanupTest(TestCase):
+    def test_clear_expired_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+        out = StringIO()
+        call_command('clear_expired_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookies_need_no_cleanup(self):
+        out = StringIO()
+        call_command('clear_expired_sessions', stdout=out)
+        self.assertIn('keeps no session table', out.getvalue())
@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, reverse
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.views.generic import View
-from django.core.paginator import Paginator
+from tickets.pagination import CursorPaginator
 from django.db.models import Q
 from . forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
 from django.contrib.auth.decorators import login_required
@@ -40,7 +40,7 @@ class LogoutView(View):
 def manage_users(request):
     # Get all users and tickets
     users = CustomUser.objects.all()
-    tickets = Ticket.objects.all()
+    tickets = Ticket.objects.for_listing()
     
     search_query = request .GET.get('search')
     if search_query:
@@ -66,9 +66,8 @@ def manage_users(request):
         return redirect('manage-users')
     
     # Paginate the user table
-    paginator = Paginator(tickets, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(tickets, 5, estimate=True)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {'users': users, 'tickets': tickets, 
                'page_obj': page_obj, 'search_query': search_query}
@@ -78,11 +77,11 @@ def manage_users(request):
 
 @login_required
 def profile(request):
-    user_created_tickets = Ticket.objects.filter(
+    user_created_tickets = Ticket.objects.for_listing().filter(
         host=request.user
     ).order_by('-updated', '-created')
 
-    user_assigned_tickets = Ticket.objects.filter(
+    user_assigned_tickets = Ticket.objects.for_listing().filter(
         assignee=request.user
     ).order_by('-updated', '-created')
     